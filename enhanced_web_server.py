@@ -1,21 +1,108 @@
+# Use eventlet's green-thread event loop when available (must patch before other imports)
+try:
+    import eventlet
+    eventlet.monkey_patch()
+    ASYNC_MODE = 'eventlet'
+except ImportError:
+    ASYNC_MODE = 'threading'
+
 from flask import Flask, render_template, jsonify, request, Response
 from flask_socketio import SocketIO, emit
-import threading
-import base64
 import json
 import time
 import socket
 import os
-from real_video_stream import global_video_streamer
+import queue
+import struct
+import threading
+from collections import deque
+from functools import lru_cache
+
+# pybase64 is a SIMD drop-in for the stdlib base64 module
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+# orjson is optional: much faster than stdlib json and emits bytes directly
+try:
+    import orjson
+    from flask.json.provider import JSONProvider
+except ImportError:
+    orjson = None
+
+def dump_json_bytes(obj):
+    """Serialize obj to UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj).encode()
+
+if orjson is not None:
+    class OrjsonProvider(JSONProvider):
+        """Flask JSON provider backed by orjson"""
+        
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+        
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+    
+    class OrjsonSocketIOJSON:
+        """Stdlib-compatible json module shim for Socket.IO packets"""
+        
+        @staticmethod
+        def dumps(obj, *args, **kwargs):
+            # Socket.IO passes separators=...; orjson output is already compact
+            return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+        
+        @staticmethod
+        def loads(s, *args, **kwargs):
+            return orjson.loads(s)
+
+# flask-sock is optional: raw WebSocket route for the hot video path
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'nirob_rtsp_web_2024'
-socketio = SocketIO(app, cors_allowed_origins="*")
+video_sock = Sock(app) if Sock is not None else None
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+    socketio = SocketIO(app, async_mode=ASYNC_MODE, cors_allowed_origins="*",
+                        json=OrjsonSocketIOJSON)
+else:
+    socketio = SocketIO(app, async_mode=ASYNC_MODE, cors_allowed_origins="*")
 
 # Global server instance
 rtsp_server_thread = None
 server_running = False
 
+# Video streamer, imported on first use (loading it preloads every video)
+global_video_streamer = None
+
+def get_video_streamer():
+    """Return the shared video streamer, loading it on first request"""
+    global global_video_streamer
+    if global_video_streamer is None:
+        from real_video_stream import global_video_streamer as streamer
+        global_video_streamer = streamer
+    return global_video_streamer
+
+# video_frame events carry (metadata dict, concatenated raw JPEG bytes)
+FRAME_BATCH_SIZE = 3  # frames packed into one binary emit
+FRAME_INTERVAL = 1 / 25.0  # 25 FPS
+FRAME_PREFETCH = 4  # frames decoded ahead of the emit loop
+
+# Raw /ws/video frames: frame number, timestamp (ns) + JPEG bytes
+RAW_FRAME_HEADER = struct.Struct('!IQ')
+
+# RTSP liveness probe
+RTSP_PORT = 8554
+STATUS_CACHE_SECONDS = 0.5
+STATUS_PROBE_TIMEOUT = 0.05
+
 @app.route('/')
 def index():
     return render_template('enhanced_player.html')
@@ -43,7 +130,7 @@ def start_server():
 def get_videos():
     # Get real video list from video streamer
     try:
-        video_list = global_video_streamer.get_video_list()
+        video_list = get_video_streamer().get_video_list()
         return jsonify({"videos": video_list})
     except Exception as e:
         # Fallback video list
@@ -59,28 +146,73 @@ def get_videos():
             ]
         })
 
+class RTSPHealthProbe:
+    """RTSP liveness check: one short-lived connection per check"""
+    
+    def __init__(self, host='localhost', port=RTSP_PORT):
+        self.addr = (host, port)
+        self.lock = threading.Lock()
+    
+    def is_alive(self):
+        """True if the RTSP server is up"""
+        # Close straight away: an idle connection would hold one of the
+        # server's MAX_CLIENTS handler workers until its idle timeout
+        with self.lock:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.settimeout(STATUS_PROBE_TIMEOUT)
+            try:
+                return sock.connect_ex(self.addr) == 0
+            finally:
+                sock.close()
+
+health_probe = RTSPHealthProbe()
+
+@lru_cache(maxsize=1)
+def probe_rtsp_server(time_bucket):
+    """Check whether the RTSP server is up (one probe per time bucket)"""
+    return health_probe.is_alive()
+
+def rtsp_server_online():
+    """Cached RTSP liveness, refreshed at most every STATUS_CACHE_SECONDS"""
+    return probe_rtsp_server(int(time.monotonic() / STATUS_CACHE_SECONDS))
+
+# Video names and pre-rendered status bodies, rebuilt when the video set changes
+video_snapshot = None
+
+def get_video_snapshot():
+    """Return the cached video snapshot, refreshing it if the streamer's videos changed"""
+    global video_snapshot
+    videos = get_video_streamer().videos
+    # The snapshot only depends on the names, so compare them directly:
+    # an in-place rename keeps the dict's id and length
+    names = tuple(videos)
+    
+    if video_snapshot is None or video_snapshot['names'] != names:
+        video_snapshot = {
+            'names': names,
+            'status_json': {
+                True: dump_json_bytes({
+                    "status": "running",
+                    "message": "✅ RTSP Server + Real Video Streaming Online",
+                    "port": RTSP_PORT,
+                    "video_count": len(names)
+                }),
+                False: dump_json_bytes({
+                    "status": "stopped", 
+                    "message": "❌ RTSP Server is offline",
+                    "port": RTSP_PORT,
+                    "video_count": len(names)
+                })
+            }
+        }
+    return video_snapshot
+
 @app.route('/api/server_status')
 def server_status():
     try:
         # Check if RTSP server is running
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        result = sock.connect_ex(('localhost', 8554))
-        sock.close()
-        
-        if result == 0:
-            return jsonify({
-                "status": "running",
-                "message": "✅ RTSP Server + Real Video Streaming Online",
-                "port": 8554,
-                "video_count": len(global_video_streamer.videos)
-            })
-        else:
-            return jsonify({
-                "status": "stopped", 
-                "message": "❌ RTSP Server is offline",
-                "port": 8554,
-                "video_count": len(global_video_streamer.videos)
-            })
+        body = get_video_snapshot()['status_json'][rtsp_server_online()]
+        return Response(body, mimetype='application/json')
     except Exception as e:
         return jsonify({
             "status": "error",
@@ -91,9 +223,10 @@ def server_status():
 def on_connect():
     emit('status_update', {'message': '🔗 Connected to Enhanced Video Web Server'})
     # Send video info on connect
+    names = get_video_snapshot()['names']
     video_info = {
-        'available_videos': len(global_video_streamer.videos),
-        'loaded_videos': list(global_video_streamer.videos.keys())
+        'available_videos': len(names),
+        'loaded_videos': names
     }
     emit('video_info', video_info)
 
@@ -101,17 +234,18 @@ def on_connect():
 def handle_rtsp_command(data):
     command = data.get('command')
     video = data.get('video', 'nirob.mp4')
+    streamer = get_video_streamer()
     
     if command == 'SETUP':
         emit('status_update', {'message': f'📋 Setting up real {video}...'})
-        if video in global_video_streamer.videos:
+        if video in streamer.videos:
             emit('setup_complete', {'video': video})
             emit('status_update', {'message': f'✅ {video} ready for streaming!'})
         else:
             emit('status_update', {'message': f'❌ Video {video} not found!'})
         
     elif command == 'PLAY':
-        if global_video_streamer.start_stream(video):
+        if streamer.start_stream(video):
             emit('status_update', {'message': f'▶️ Playing real {video} video...'})
             emit('video_start', {'video': video})
             # Start real frame streaming
@@ -124,52 +258,154 @@ def handle_rtsp_command(data):
         emit('video_pause', {})
         
     elif command == 'TEARDOWN':
-        global_video_streamer.stop_stream(video)
+        streamer.stop_stream(video)
         emit('status_update', {'message': '⏹️ Video stopped'})
         emit('video_stop', {})
 
+def frame_jpeg(frame_data):
+    """Raw JPEG bytes of a streamer frame"""
+    jpeg = frame_data['frame_data']
+    if isinstance(jpeg, str):
+        # Legacy streamers hand out base64 text; ship the raw JPEG instead
+        jpeg = base64.b64decode(jpeg)
+    return jpeg
+
+def prefetch_frames(streamer, video_name, frames):
+    """Producer: decode frames ahead of the emit loop into a bounded queue"""
+    try:
+        while video_name in streamer.active_streams:
+            frame_data = streamer.get_next_frame(video_name)
+            if not frame_data:
+                break
+            
+            item = (frame_data, frame_jpeg(frame_data))
+            # Block while the queue is full, but give up once the stream stops
+            while video_name in streamer.active_streams:
+                try:
+                    frames.put(item, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+    except Exception as e:
+        print(f'❌ Frame decode error for {video_name}: {e}')
+    finally:
+        # End-of-stream marker for the emit loop, sent even after a failure
+        while True:
+            try:
+                frames.put(None, timeout=0.5)
+                break
+            except queue.Full:
+                if video_name not in streamer.active_streams:
+                    break
+
+def paced_frames(streamer, video_name, stats):
+    """
+    Yield (frame_data, jpeg) pairs at 25 FPS, decoding ahead in a background task
+    
+    stats['dropped_frames'] counts frames skipped for running behind schedule.
+    """
+    # Decoding runs in its own task so it overlaps with pacing and sending
+    frames = queue.Queue(maxsize=FRAME_PREFETCH)
+    socketio.start_background_task(prefetch_frames, streamer, video_name, frames)
+    
+    start_time = time.monotonic()
+    frame_index = 0
+    
+    while video_name in streamer.active_streams:
+        try:
+            item = frames.get(timeout=0.5)
+        except queue.Empty:
+            continue  # Re-check that the stream is still active
+        if item is None:
+            break
+        
+        # Frame n is due at start + n/25; sleep only the residual so
+        # production latency never accumulates into drift
+        frame_index += 1
+        delay = start_time + frame_index * FRAME_INTERVAL - time.monotonic()
+        if delay < -FRAME_INTERVAL:
+            # More than a frame behind schedule: skip instead of sending stale frames
+            stats['dropped_frames'] += 1
+            continue
+        if delay > 0:
+            socketio.sleep(delay)
+        
+        yield item
+
 def start_frame_streaming(video_name):
     """Stream real video frames in real-time"""
     def stream_frames():
         frame_count = 0
-        start_time = time.time()
+        stats = {'dropped_frames': 0}
+        start_time = time.monotonic()
+        batch = deque()
+        
+        def flush_batch():
+            # Metadata travels as JSON; the JPEGs go as one binary attachment
+            # that the browser slices by size into Blobs (no base64 anywhere)
+            metadata = {
+                'video': video_name,
+                'frames': [info for info, _ in batch]  # [frame_number, timestamp, size]
+            }
+            socketio.emit('video_frame', (metadata, b''.join(jpeg for _, jpeg in batch)))
+            batch.clear()
         
         print(f'🎬 Starting frame streaming for {video_name}...')
         
-        while video_name in global_video_streamer.active_streams:
-            frame_data = global_video_streamer.get_next_frame(video_name)
-            if frame_data:
-                # Emit real video frame
-                socketio.emit('video_frame', {
-                    'frame_data': frame_data['frame_data'],
-                    'frame_number': frame_data['frame_number'],
-                    'video': video_name,
-                    'timestamp': frame_data['timestamp']
-                })
-                frame_count += 1
-                
-                # Control frame rate (25 FPS = 40ms)
-                time.sleep(0.04)
-                    
-            else:
-                break
+        for frame_data, jpeg in paced_frames(get_video_streamer(), video_name, stats):
+            batch.append(([frame_data['frame_number'], frame_data['timestamp'], len(jpeg)], jpeg))
+            frame_count += 1
+            
+            # Emit several frames per websocket message
+            if len(batch) >= FRAME_BATCH_SIZE:
+                flush_batch()
+        
+        # Flush frames left over from the last partial batch
+        if batch:
+            flush_batch()
         
         # Video streaming finished
+        dropped_frames = stats['dropped_frames']
         socketio.emit('video_complete', {
             'video': video_name, 
             'total_frames': frame_count,
-            'duration': time.time() - start_time
+            'dropped_frames': dropped_frames,
+            'duration': time.monotonic() - start_time
         })
-        print(f'🏁 {video_name} streaming completed! {frame_count} frames')
+        print(f'🏁 {video_name} streaming completed! {frame_count} frames ({dropped_frames} dropped)')
     
-    # Start streaming in background thread
-    threading.Thread(target=stream_frames, daemon=True).start()
+    # Start streaming as a background task (green thread under eventlet)
+    socketio.start_background_task(stream_frames)
+
+if video_sock is not None:
+    @video_sock.route('/ws/video/<video_name>')
+    def raw_video_socket(ws, video_name):
+        """Plain WebSocket video feed: one binary message per frame, no Socket.IO framing"""
+        streamer = get_video_streamer()
+        
+        # Stream starts after the browser's first control message
+        ws.receive()
+        if video_name not in streamer.videos or not streamer.start_stream(video_name):
+            ws.close()
+            return
+        
+        print(f'🎬 Raw WebSocket streaming for {video_name}...')
+        stats = {'dropped_frames': 0}
+        try:
+            for frame_data, jpeg in paced_frames(streamer, video_name, stats):
+                # Frame number + timestamp (seconds -> ns) header, then the JPEG
+                header = RAW_FRAME_HEADER.pack(frame_data['frame_number'],
+                                               int(frame_data['timestamp'] * 1e9))
+                ws.send(header + jpeg)
+        finally:
+            streamer.stop_stream(video_name)
 
 @app.route('/api/video_info/<video_name>')
 def get_video_info(video_name):
     """Get detailed video information"""
-    if video_name in global_video_streamer.videos:
-        info = global_video_streamer.videos[video_name].get_info()
+    videos = get_video_streamer().videos
+    if video_name in videos:
+        info = videos[video_name].get_info()
         return jsonify(info)
     else:
         return jsonify({"error": "Video not found"}), 404
@@ -178,6 +414,7 @@ if __name__ == '__main__':
     print("🎬 Starting Enhanced Nirob's Real Video Web Server...")
     print("📱 Features: Real MP4 streaming, Frame-by-frame delivery")
     print("🌐 Access at: http://localhost:5001")
-    print(f"📹 Loaded videos: {list(global_video_streamer.videos.keys())}")
+    print(f"⚡ Async mode: {ASYNC_MODE}")
+    print("📹 Videos load on first request")
     
     socketio.run(app, host='0.0.0.0', port=5001, debug=False)
\ No newline at end of file
@@ -0,0 +1,257 @@
+"""
+Batched UDP I/O for RTP Streaming
+Sends many RTP datagrams per system call using Linux sendmmsg(2)
+"""
+
+import ctypes
+import ctypes.util
+import os
+import socket
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class Py_buffer(ctypes.Structure):
+    """CPython buffer view (used to get the address of read-only buffers)"""
+    _fields_ = [('buf', ctypes.c_void_p),
+                ('obj', ctypes.c_void_p),
+                ('len', ctypes.c_ssize_t),
+                ('itemsize', ctypes.c_ssize_t),
+                ('readonly', ctypes.c_int),
+                ('ndim', ctypes.c_int),
+                ('format', ctypes.c_char_p),
+                ('shape', ctypes.c_void_p),
+                ('strides', ctypes.c_void_p),
+                ('suboffsets', ctypes.c_void_p),
+                ('internal', ctypes.c_void_p)]
+
+class iovec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p),
+                ('iov_len', ctypes.c_size_t)]
+
+class msghdr(ctypes.Structure):
+    _fields_ = [('msg_name', ctypes.c_void_p),
+                ('msg_namelen', ctypes.c_uint32),
+                ('msg_iov', ctypes.POINTER(iovec)),
+                ('msg_iovlen', ctypes.c_size_t),
+                ('msg_control', ctypes.c_void_p),
+                ('msg_controllen', ctypes.c_size_t),
+                ('msg_flags', ctypes.c_int)]
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', msghdr),
+                ('msg_len', ctypes.c_uint)]
+
+class sockaddr_in(ctypes.Structure):
+    _fields_ = [('sin_family', ctypes.c_ushort),
+                ('sin_port', ctypes.c_ubyte * 2),   # Network byte order
+                ('sin_addr', ctypes.c_ubyte * 4),   # Network byte order
+                ('sin_zero', ctypes.c_ubyte * 8)]
+
+# Resolve sendmmsg from libc (Linux only)
+_sendmmsg = None
+if sys.platform.startswith('linux'):
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        _sendmmsg = _libc.sendmmsg
+        _sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int]
+        _sendmmsg.restype = ctypes.c_int
+
+        _get_buffer = ctypes.pythonapi.PyObject_GetBuffer
+        _get_buffer.argtypes = [ctypes.py_object, ctypes.POINTER(Py_buffer), ctypes.c_int]
+        _get_buffer.restype = ctypes.c_int
+        _release_buffer = ctypes.pythonapi.PyBuffer_Release
+        _release_buffer.argtypes = [ctypes.POINTER(Py_buffer)]
+        _release_buffer.restype = None
+    except (OSError, AttributeError):
+        _sendmmsg = None
+
+HAVE_SENDMMSG = _sendmmsg is not None
+
+# send_frame fills iovec/mmsghdr arrays as flat 64-bit words; only valid
+# for the LP64 Linux layout (16-byte iovec, 64-byte mmsghdr)
+_FLAT_LAYOUT = (np is not None and ctypes.sizeof(iovec) == 16 and
+                ctypes.sizeof(mmsghdr) == 64 and sys.byteorder == 'little')
+
+def _buffer_address(buf):
+    """
+    Get the address and length of any bytes-like object without copying
+
+    Args:
+        buf: bytes, bytearray or memoryview (read-only views are fine)
+
+    Returns:
+        tuple: (address, length in bytes)
+    """
+    view = Py_buffer()
+    _get_buffer(buf, ctypes.byref(view), 0)
+    try:
+        return view.buf, view.len
+    finally:
+        _release_buffer(ctypes.byref(view))
+
+def _make_sockaddr(addr):
+    """Build a sockaddr_in for an (host, port) IPv4 address"""
+    host, port = addr
+    name = sockaddr_in()
+    name.sin_family = socket.AF_INET
+    name.sin_port[:] = port.to_bytes(2, 'big')
+    name.sin_addr[:] = socket.inet_aton(socket.gethostbyname(host))
+    return name
+
+def _send_loop(sock, packets, addr):
+    """Fallback: one send call per datagram"""
+    for buffers in packets:
+        if hasattr(sock, 'sendmsg'):
+            if addr is None:
+                sock.sendmsg(buffers)
+            else:
+                sock.sendmsg(buffers, [], 0, addr)
+        elif addr is None:
+            sock.send(b''.join(buffers))
+        else:
+            sock.sendto(b''.join(buffers), addr)
+    return len(packets)
+
+def send_batch(sock, packets, addr=None):
+    """
+    Send several datagrams with as few system calls as possible
+
+    Args:
+        sock (socket.socket): UDP socket
+        packets (list): One entry per datagram; each entry is a sequence of
+                        bytes-like buffers (e.g. header, payload) that are
+                        gathered into that datagram without copying
+        addr (tuple): Destination (host, port), or None for a connected socket
+
+    Returns:
+        int: Number of datagrams sent
+    """
+    if not packets:
+        return 0
+    if not HAVE_SENDMMSG or sock.family != socket.AF_INET:
+        return _send_loop(sock, packets, addr)
+
+    count = len(packets)
+    msgs = (mmsghdr * count)()
+    iov_arrays = []  # Keep iovec arrays alive until the call returns
+
+    name = _make_sockaddr(addr) if addr is not None else None
+
+    for i, buffers in enumerate(packets):
+        iov = (iovec * len(buffers))()
+        for j, buf in enumerate(buffers):
+            iov[j].iov_base, iov[j].iov_len = _buffer_address(buf)
+        iov_arrays.append(iov)
+
+        hdr = msgs[i].msg_hdr
+        hdr.msg_iov = iov
+        hdr.msg_iovlen = len(buffers)
+        if name is not None:
+            hdr.msg_name = ctypes.addressof(name)
+            hdr.msg_namelen = ctypes.sizeof(name)
+
+    return _sendmmsg_all(sock, msgs, count)
+
+def _sendmmsg_all(sock, msgs, count):
+    """Submit an mmsghdr array, resubmitting the rest after a partial send"""
+    sent = 0
+    while sent < count:
+        result = _sendmmsg(sock.fileno(), ctypes.byref(msgs[sent]), count - sent, 0)
+        if result < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        sent += result
+
+    return sent
+
+class SendSlab:
+    """Reusable iovec/mmsghdr arrays for send_frame, grown on demand"""
+
+    def __init__(self, capacity=64):
+        """
+        Args:
+            capacity (int): Packets per frame the arrays hold before growing
+        """
+        self.capacity = 0
+        self.addr = None  # Destination the cached sockaddr was built for
+        self.name = None
+        self.reserve(capacity)
+
+    def reserve(self, count):
+        """Make room for count packets (reallocates only when growing)"""
+        if count <= self.capacity or not _FLAT_LAYOUT:
+            return  # Nothing to hold when send_frame uses the fallback path
+        self.capacity = count
+        self.iov = (iovec * (2 * count))()
+        self.msgs = (mmsghdr * count)()
+        self.iov_words = np.frombuffer(self.iov, dtype=np.uint64).reshape(count, 4)
+        self.msg_words = np.frombuffer(self.msgs, dtype=np.uint64).reshape(count, 8)
+        self.index = np.arange(count, dtype=np.int64)
+
+        # The iov pointer and count of each message never change
+        self.msg_words[:, 2] = ctypes.addressof(self.iov) + self.index * 32
+        self.msg_words[:, 3] = 2
+
+def send_frame(sock, headers, payload, mtu, addr=None, slab=None):
+    """
+    Send a fragmented frame: packet i is headers[i] + payload[i*mtu:(i+1)*mtu]
+
+    The iovec and mmsghdr arrays are filled with whole-column NumPy writes
+    from two base addresses instead of per-packet Python work, then one
+    sendmmsg call sends every fragment.
+
+    Args:
+        sock (socket.socket): UDP socket
+        headers: Contiguous n * 12 bytes of RTP headers (e.g. (n, 12) uint8 array)
+        payload: Frame bytes shared by all fragments (not copied)
+        mtu (int): Payload bytes per fragment
+        addr (tuple): Destination (host, port), or None for a connected socket
+        slab (SendSlab): Arrays to reuse across frames (allocated per call if None)
+
+    Returns:
+        int: Number of datagrams sent
+    """
+    hdr_view = memoryview(headers).cast('B')
+    pay_view = memoryview(payload)
+    count = len(hdr_view) // 12
+    if not count:
+        return 0
+
+    if not HAVE_SENDMMSG or not _FLAT_LAYOUT or sock.family != socket.AF_INET:
+        packets = [(hdr_view[i * 12:(i + 1) * 12], pay_view[i * mtu:(i + 1) * mtu])
+                   for i in range(count)]
+        return send_batch(sock, packets, addr)
+
+    if slab is None:
+        slab = SendSlab(count)
+    slab.reserve(count)
+
+    hdr_addr, _ = _buffer_address(hdr_view)
+    pay_addr, size = _buffer_address(pay_view)
+    index = slab.index[:count]
+
+    # Two iovecs per packet: [header base, 12, payload base, length]
+    iov_words = slab.iov_words[:count]
+    iov_words[:, 0] = hdr_addr + index * 12
+    iov_words[:, 1] = 12
+    iov_words[:, 2] = pay_addr + index * mtu
+    iov_words[:, 3] = np.minimum(mtu, size - index * mtu)
+
+    # mmsghdr words: name, namelen, iov, iovlen, control, controllen, flags, msg_len
+    msg_words = slab.msg_words[:count]
+    if addr != slab.addr:
+        # Resolve and build the sockaddr once per destination, not per frame
+        slab.name = _make_sockaddr(addr) if addr is not None else None
+        slab.addr = addr
+    name = slab.name
+    if name is not None:
+        msg_words[:, 0] = ctypes.addressof(name)
+        msg_words[:, 1] = ctypes.sizeof(name)
+    else:
+        msg_words[:, 0:2] = 0
+
+    return _sendmmsg_all(sock, slab.msgs, count)
@@ -6,8 +6,42 @@ Handles RTP packet creation, parsing, and management
 import struct
 import time
 
+from rtp_batch import send_batch, send_frame
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# RTP fixed header as a packed NumPy record (12 bytes, network byte order)
+RTP_HEADER_DTYPE = None
+if np is not None:
+    RTP_HEADER_DTYPE = np.dtype([('b1', 'u1'), ('b2', 'u1'), ('seq', '>u2'),
+                                 ('ts', '>u4'), ('ssrc', '>u4')])
+
+def _header_rows(n, base_ts, ssrc, seq0, byte1, byte2, marker_last):
+    """
+    Build n RTP headers with whole-column NumPy writes
+    
+    Returns:
+        ndarray: (n, 12) uint8 array, one header per row
+    """
+    hdrs = np.empty(n, dtype=RTP_HEADER_DTYPE)
+    hdrs['b1'] = byte1
+    hdrs['b2'] = byte2
+    hdrs['seq'] = (np.arange(seq0, seq0 + n, dtype=np.int64) & 0xFFFF).astype(np.uint16)
+    hdrs['ts'] = base_ts
+    hdrs['ssrc'] = ssrc
+    if marker_last:
+        hdrs['b2'][-1] |= 0x80
+    return hdrs.view(np.uint8).reshape(n, RTPPacket.HEADER_SIZE)
+
 class RTPPacket:
     HEADER_SIZE = 12
+    _HDR = struct.Struct('!BBHII')  # V|P|X|CC, M|PT, sequence, timestamp, SSRC
+    FIELDS = ('version', 'padding', 'extension', 'cc', 'marker', 'pt',
+              'seq_num', 'timestamp', 'ssrc', 'payload')
+    __slots__ = FIELDS + ('_encoded',)  # No per-instance __dict__
     
     def __init__(self, version=2, padding=0, extension=0, cc=0, marker=0, 
                  pt=26, seq_num=0, timestamp=0, ssrc=0, payload=b''):
@@ -36,29 +70,39 @@ class RTPPacket:
         self.timestamp = timestamp
         self.ssrc = ssrc
         self.payload = payload
+        self._encoded = None
     
     def encode(self):
         """
         Encode RTP packet to bytes
         
+        The result is cached, so retransmitting a packet does not re-pack it;
+        fields are treated as fixed once a packet has been encoded.
+        
         Returns:
             bytes: Encoded RTP packet
         """
+        if self._encoded is not None:
+            return self._encoded
+        
         # First byte: V(2) + P(1) + X(1) + CC(4)
         byte1 = (self.version << 6) | (self.padding << 5) | (self.extension << 4) | self.cc
         
         # Second byte: M(1) + PT(7)
         byte2 = (self.marker << 7) | self.pt
         
-        # Pack RTP header (12 bytes)
-        header = struct.pack('!BBHII', 
-                           byte1,           # V|P|X|CC
-                           byte2,           # M|PT
-                           self.seq_num,    # Sequence number
-                           self.timestamp,  # Timestamp
-                           self.ssrc)       # SSRC
+        # Pack RTP header (12 bytes) and payload into a single buffer
+        buf = bytearray(self.HEADER_SIZE + len(self.payload))
+        self._HDR.pack_into(buf, 0,
+                            byte1,           # V|P|X|CC
+                            byte2,           # M|PT
+                            self.seq_num,    # Sequence number
+                            self.timestamp,  # Timestamp
+                            self.ssrc)       # SSRC
+        buf[self.HEADER_SIZE:] = self.payload
         
-        return header + self.payload
+        self._encoded = bytes(buf)
+        return self._encoded
     
     def decode(self, packet_data):
         """
@@ -67,29 +111,10 @@ class RTPPacket:
         Args:
             packet_data (bytes): Raw packet data
         """
-        if len(packet_data) < self.HEADER_SIZE:
-            raise ValueError("Packet too short for RTP header")
-        
-        # Unpack header
-        byte1, byte2, seq_num, timestamp, ssrc = struct.unpack('!BBHII', 
-                                                               packet_data[:self.HEADER_SIZE])
-        
-        # Extract header fields
-        self.version = (byte1 >> 6) & 0x3
-        self.padding = (byte1 >> 5) & 0x1
-        self.extension = (byte1 >> 4) & 0x1
-        self.cc = byte1 & 0xF
-        
-        self.marker = (byte2 >> 7) & 0x1
-        self.pt = byte2 & 0x7F
-        
-        # Set packet fields
-        self.seq_num = seq_num
-        self.timestamp = timestamp
-        self.ssrc = ssrc
-        
-        # Extract payload
-        self.payload = packet_data[self.HEADER_SIZE:]
+        packet = self.decode_packet(packet_data)
+        for field in self.FIELDS:
+            setattr(self, field, getattr(packet, field))
+        self._encoded = None
 
     @classmethod
     def decode_packet(cls, packet_data):
@@ -97,7 +122,8 @@ class RTPPacket:
         Decode RTP packet from bytes (class method)
         
         Args:
-            packet_data (bytes): Raw packet data
+            packet_data (bytes): Raw packet data; a memoryview is decoded
+                                 without copying (payload is then a view)
             
         Returns:
             RTPPacket: Decoded RTP packet object
@@ -106,8 +132,7 @@ class RTPPacket:
             raise ValueError("Packet too short for RTP header")
         
         # Unpack header
-        byte1, byte2, seq_num, timestamp, ssrc = struct.unpack('!BBHII', 
-                                                               packet_data[:cls.HEADER_SIZE])
+        byte1, byte2, seq_num, timestamp, ssrc = cls._HDR.unpack_from(packet_data, 0)
         
         # Extract header fields
         version = (byte1 >> 6) & 0x3
@@ -124,20 +149,103 @@ class RTPPacket:
         return cls(version, padding, extension, cc, marker, pt, 
                   seq_num, timestamp, ssrc, payload)
     
+    @classmethod
+    def decode_many(cls, buffers):
+        """
+        Decode the headers of many RTP packets at once with NumPy
+        
+        Args:
+            buffers (list): Raw packets (bytes-like)
+            
+        Returns:
+            dict: Column arrays 'version', 'padding', 'extension', 'cc',
+                  'marker', 'pt', 'seq_num', 'timestamp', 'ssrc' and
+                  'payload_len', one entry per packet
+        """
+        if np is None:
+            raise ImportError("NumPy is required for decode_many")
+        if any(len(buf) < cls.HEADER_SIZE for buf in buffers):
+            raise ValueError("Packet too short for RTP header")
+        
+        # One contiguous buffer of headers, viewed as packed records
+        raw = b''.join(bytes(buf[:cls.HEADER_SIZE]) for buf in buffers)
+        hdr = np.frombuffer(raw, dtype=RTP_HEADER_DTYPE)
+        b1 = hdr['b1']
+        b2 = hdr['b2']
+        
+        return {
+            'version': b1 >> 6,
+            'padding': (b1 >> 5) & 0x1,
+            'extension': (b1 >> 4) & 0x1,
+            'cc': b1 & 0xF,
+            'marker': b2 >> 7,
+            'pt': b2 & 0x7F,
+            'seq_num': hdr['seq'].astype(np.uint16),
+            'timestamp': hdr['ts'].astype(np.uint32),
+            'ssrc': hdr['ssrc'].astype(np.uint32),
+            'payload_len': np.fromiter((len(buf) - cls.HEADER_SIZE for buf in buffers),
+                                       dtype=np.int64, count=len(buffers))
+        }
+    
     def __str__(self):
         """String representation of RTP packet"""
         return (f"RTP Packet: V={self.version}, PT={self.pt}, "
                 f"Seq={self.seq_num}, TS={self.timestamp}, "
                 f"SSRC={self.ssrc}, Payload={len(self.payload)} bytes")
 
+# Marker/payload-type byte and sequence number (skips the first header byte)
+_SEQ_MARKER = struct.Struct('!xBH')
+
+def fragment(frame_data, mtu=1400):
+    """
+    Split a frame into RTP-payload-sized chunks without copying
+    
+    Args:
+        frame_data (bytes): Complete video frame
+        mtu (int): Maximum payload bytes per chunk
+        
+    Yields:
+        tuple: (memoryview chunk, True for the last chunk of the frame)
+    """
+    view = memoryview(frame_data)
+    size = len(view)
+    last = max(0, (size - 1) // mtu) * mtu
+    for offset in range(0, last + 1, mtu):
+        yield view[offset:offset + mtu], offset == last
+
+def parse_rtp(packet_data, copy=True):
+    """
+    Receive-side fast path: only the fields needed to reassemble frames
+    
+    Args:
+        packet_data (bytes): Raw packet data (bytes, bytearray or memoryview)
+        copy (bool): Return the payload as bytes; False returns a view into
+                     packet_data (only valid while that buffer is)
+        
+    Returns:
+        tuple: (seq_num, marker, payload)
+    """
+    byte2, seq_num = _SEQ_MARKER.unpack_from(packet_data, 0)
+    payload = memoryview(packet_data)[RTPPacket.HEADER_SIZE:]
+    return seq_num, byte2 >> 7, bytes(payload) if copy else payload
+
 class RTPVideoStream:
     """RTP Video Stream Manager"""
     
     def __init__(self, ssrc=None):
         self.ssrc = ssrc or int(time.time())
         self.seq_num = 0
-        self.timestamp_base = int(time.time() * 90000)  # 90kHz clock
+        self.timestamp_base = int(time.time() * 90000) & 0xFFFFFFFF  # 90kHz clock
+        self._t0 = time.monotonic()
+        
+        # Header bytes that never change within a stream
+        self._byte1 = 0x80      # V=2, P=0, X=0, CC=0
+        self._byte2_base = 26   # M=0, PT=26 (MJPEG)
         
+    def _current_timestamp(self):
+        """Current RTP timestamp (90kHz for video, elapsed since stream start)"""
+        return (self.timestamp_base + int((time.monotonic() - self._t0) * 90000)) & 0xFFFFFFFF
+    
     def create_packet(self, frame_data, is_last_fragment=False):
         """
         Create RTP packet for video frame
@@ -149,30 +257,103 @@ class RTPVideoStream:
         Returns:
             RTPPacket: RTP packet with video data
         """
-        # Calculate timestamp (90kHz for video)
-        timestamp = self.timestamp_base + int(time.time() * 90000)
-        
         # Create RTP packet
         packet = RTPPacket(
             pt=26,  # MJPEG payload type
             seq_num=self.seq_num,
-            timestamp=timestamp,
+            timestamp=self._current_timestamp(),
             ssrc=self.ssrc,
             marker=1 if is_last_fragment else 0,
             payload=frame_data
         )
         
         # Increment sequence number
-        self.seq_num = (self.seq_num + 1) % 65536
+        self.seq_num = (self.seq_num + 1) & 0xFFFF
         
         return packet
     
+    def encode_frame(self, jpeg, mtu=1400):
+        """
+        Build all RTP headers for a frame in one vectorized pass
+        
+        Args:
+            jpeg (bytes): Complete video frame
+            mtu (int): Maximum payload bytes per packet
+            
+        Returns:
+            tuple: ((n, 12) uint8 header array, the payload itself, n + 1
+                   int64 offsets so fragment i is payload[offsets[i]:offsets[i + 1]])
+        """
+        if np is None:
+            raise ImportError("NumPy is required for encode_frame")
+        
+        size = len(jpeg)
+        n = max(1, -(-size // mtu))
+        
+        hdrs = _header_rows(n, self._current_timestamp(), self.ssrc, self.seq_num,
+                            self._byte1, self._byte2_base, 1)
+        offsets = np.minimum(np.arange(n + 1, dtype=np.int64) * mtu, size)
+        
+        self.seq_num = (self.seq_num + n) & 0xFFFF
+        
+        return hdrs, jpeg, offsets
+    
+    def create_fragments_iovec(self, frame_bytes, mtu=1400):
+        """
+        Split a frame into MTU-sized RTP packets without copying the payload
+        
+        Args:
+            frame_bytes (bytes): Complete video frame
+            mtu (int): Maximum payload bytes per packet
+            
+        Returns:
+            list: (header memoryview, payload memoryview) pair per packet,
+                  ready for rtp_batch.send_batch()
+        """
+        hdr = RTPPacket.HEADER_SIZE
+        size = len(frame_bytes)
+        n = max(1, -(-size // mtu))
+        timestamp = self._current_timestamp()
+        
+        headers = bytearray(n * hdr)
+        header_view = memoryview(headers)
+        fragments = []
+        
+        for i, (chunk, is_last) in enumerate(fragment(frame_bytes, mtu)):
+            marker = 0x80 if is_last else 0
+            RTPPacket._HDR.pack_into(headers, i * hdr, self._byte1, marker | self._byte2_base,
+                                     (self.seq_num + i) & 0xFFFF, timestamp, self.ssrc)
+            fragments.append((header_view[i * hdr:(i + 1) * hdr], chunk))
+        
+        self.seq_num = (self.seq_num + n) & 0xFFFF
+        
+        return fragments
+    
+    def send_frame(self, sock, frame_bytes, addr=None, mtu=1400, slab=None):
+        """
+        Fragment, stamp and send a whole frame with one batched send
+        
+        Args:
+            sock (socket.socket): UDP socket
+            frame_bytes (bytes): Complete video frame (payload is not copied)
+            addr (tuple): Destination (host, port), or None for a connected socket
+            mtu (int): Maximum payload bytes per packet
+            slab (SendSlab): Send arrays reused across frames
+        
+        Returns:
+            int: Number of RTP packets sent
+        """
+        if np is not None:
+            headers, _, _ = self.encode_frame(frame_bytes, mtu)
+            return send_frame(sock, headers, frame_bytes, mtu, addr, slab)
+        return send_batch(sock, self.create_fragments_iovec(frame_bytes, mtu), addr)
+    
     def get_stats(self):
         """Get streaming statistics"""
         return {
             'packets_sent': self.seq_num,
             'ssrc': self.ssrc,
-            'current_timestamp': self.timestamp_base + int(time.time() * 90000)
+            'current_timestamp': self._current_timestamp()
         }
 
 # Example usage
@@ -191,7 +372,7 @@ if __name__ == "__main__":
     print(f"Encoded packet size: {len(encoded)} bytes")
     
     # Decode packet
-    decoded = RTPPacket.decode(encoded)
+    decoded = RTPPacket.decode_packet(encoded)
     print(f"Decoded: {decoded}")
     
     # Verify payload
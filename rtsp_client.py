@@ -6,30 +6,68 @@ Connects to RTSP server and displays video stream
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import socket
+import re
+import selectors
 import threading
+import queue
+import collections
 import time
 from PIL import Image, ImageTk
+import PIL
 import io
-from rtp_packet import RTPPacket
+from rtp_packet import parse_rtp
+
+# JPEG decode speed depends on how Pillow was built
+try:
+    from PIL import features
+    HAVE_JPEG_TURBO = bool(features.check('libjpeg_turbo'))
+except (ImportError, ValueError):
+    HAVE_JPEG_TURBO = False
+
+# Pillow-SIMD releases carry a ".postN" version suffix
+PILLOW_SIMD = '.post' in PIL.__version__
+
+# RTSP reply fields, matched directly on the received bytes
+_RE_STATUS = re.compile(rb"RTSP/1\.0 (\d+)")
+_RE_SESSION = re.compile(rb"Session:\s*([^;\r\n]+)")
 
 class RTSPClient:
     """RTSP Client with GUI Interface"""
     
     RTSP_VER = "RTSP/1.0"
     
+    # method: (extra header, needs session); the header's %d/%b takes the
+    # client RTP port or the session ID
+    REQUESTS = {
+        "SETUP": ("Transport: RTP/UDP;client_port=%d", False),
+        "PLAY": ("Session: %b", True),
+        "PAUSE": ("Session: %b", True),
+        "TEARDOWN": ("Session: %b", True),
+    }
+    
+    # Kernel receive buffer for the RTP socket (absorbs MJPEG bursts)
+    RTP_RCVBUF = 12 * 1024 * 1024
+    RTP_RCVBUF_MIN = 4 * 1024 * 1024
+    
+    # Largest RTP datagram expected (the server fragments frames to 1400-byte payloads)
+    RTP_MAX_DATAGRAM = 2048
+    
     def __init__(self):
         # Connection settings
         self.server_addr = "127.0.0.1"
         self.server_port = 8554
-        self.rtp_port = self.get_available_port()
+        self.rtp_port = 0  # Picked by the kernel when the RTP socket is bound
         self.filename = ""
         
         # RTSP connection
         self.rtsp_socket = None
+        self.rtsp_reader = None
         self.rtp_socket = None
+        self.rtp_connected = False  # Connected to the server's RTP source
         self.seq_num = 0
-        self.session_id = None
+        self.session_id = None  # bytes, as sent by the server
         self.request_sent = -1
+        self.request_templates = {}
         self.teardown_acked = 0
         
         # Video playback
@@ -39,27 +77,44 @@ class RTSPClient:
         
         # Threading
         self.rtp_thread = None
+        self.decode_thread = None
         self.rtp_running = False
         
+        # Self-pipe used to wake the RTP listener when stopping
+        self.wake_r, self.wake_w = socket.socketpair()
+        self.wake_r.setblocking(False)
+        self.wake_w.setblocking(False)
+        
+        # Reusable RTP receive buffer (recvfrom fallback path)
+        self.rx_buf = bytearray(self.RTP_MAX_DATAGRAM)
+        self.rx_view = memoryview(self.rx_buf)
+        
+        # Frame reassembly from RTP fragments (RTP thread only)
+        self.rx_frame = bytearray()
+        self.rx_next_seq = None
+        self.rx_frame_ok = True
+        
+        # Receive -> decode -> display pipeline
+        # Newest-wins: a frame the decoder has not started yet is replaced
+        # by a newer one rather than queued behind it (latency over throughput)
+        self.jpeg_q = queue.Queue(maxsize=1)   # Raw JPEG payloads
+        self.frame_q = queue.Queue(maxsize=1)  # Decoded, resized PIL images
+        self.dropped_frames = 0
+        self.jpeg_io = io.BytesIO()  # Decoder thread only; resize() consumes it before reuse
+        self.canvas_size = (500, 300)
+        
+        # Persistent frame image, updated in place with paste()
+        self.photo = None
+        self.photo_size = None
+        self.canvas_img_id = None
+        self.canvas_img_pos = None
+        
         # Setup GUI
         self.setup_gui()
         
         # Connect to server on startup
         self.connect_to_server()
     
-    def get_available_port(self, start_port=25000):
-        """Find an available RTP port"""
-        import socket
-        for port in range(start_port, start_port + 100):
-            try:
-                test_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                test_socket.bind(('', port))
-                test_socket.close()
-                return port
-            except socket.error:
-                continue
-        return start_port  # Fallback
-    
     def setup_gui(self):
         """Setup GUI interface"""
         self.root = tk.Tk()
@@ -171,6 +226,13 @@ class RTSPClient:
         
         # Status frame
         self.setup_status_frame(main_frame)
+        
+        # Display decoded frames from the Tk thread
+        self.root.after(16, self._pump_frames)
+        
+        # Refresh counters at 10 Hz instead of per packet
+        self.shown_counters = (0, 0)
+        self.root.after(100, self._tick)
     
     def setup_connection_frame(self, parent):
         """Setup connection controls"""
@@ -213,12 +275,31 @@ class RTSPClient:
                                     bd=2)
         self.video_canvas.pack(expand=True, fill=tk.BOTH, padx=5, pady=5)
         
-        # Enhanced welcome message with nirob branding
-        self.video_canvas.create_text(250, 150, 
+        # Track the canvas size from resize events instead of querying Tk per frame
+        self.video_canvas.bind("<Configure>", self.on_canvas_configure)
+        
+        # Overlay messages are created once and toggled with itemconfigure
+        self.overlays = {
+            # Enhanced welcome message with nirob branding
+            'welcome': self.video_canvas.create_text(250, 150, 
                                     text="🎬 Nirob's Video Player\n📺 Ready for MP4 Streaming\n✨ Enhanced RTSP/RTP Lab\n\n🔵 SETUP → ▶️ PLAY", 
                                     fill='#58a6ff', 
                                     font=('Segoe UI', 14, 'bold'), 
-                                    justify=tk.CENTER)
+                                    justify=tk.CENTER),
+            'starting': self.video_canvas.create_text(200, 120, 
+                                    text="🎬 Starting Video Stream...\nReceiving frames...", 
+                                    fill='#a6e3a1', font=('Arial', 12, 'bold'), 
+                                    justify=tk.CENTER, state='hidden'),
+            'stopped': self.video_canvas.create_text(200, 120, 
+                                    text="📺 Video Stopped\n🔄 Ready for new stream", 
+                                    fill='#fab387', font=('Arial', 12, 'bold'), 
+                                    justify=tk.CENTER, state='hidden'),
+            'error': self.video_canvas.create_text(200, 120, 
+                                    text="", 
+                                    fill='#f38ba8', font=('Arial', 10, 'bold'), 
+                                    justify=tk.CENTER, state='hidden'),
+        }
+        self.active_overlay = 'welcome'
     
     def setup_control_frame(self, parent):
         """Setup playback controls"""
@@ -275,39 +356,56 @@ class RTSPClient:
         self.status_text.configure(yscrollcommand=scrollbar.set)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
+        # Configure text tags for colors
+        self.status_text.tag_configure('timestamp', foreground='#89b4fa')
+        self.status_text.tag_configure('success', foreground='#a6e3a1')
+        self.status_text.tag_configure('error', foreground='#f38ba8')
+        self.status_text.tag_configure('request', foreground='#fab387')
+        self.status_text.tag_configure('response', foreground='#cba6f7')
+        self.status_text.tag_configure('info', foreground='#cdd6f4')
+        
+        # Log lines are buffered and written to the widget at 10 Hz
+        self.log_q = collections.deque(maxlen=500)
+        self.root.after(100, self._flush_log)
+        
         self.log_message("🚀 Nirob's Enhanced RTSP Client Initialized")
         self.log_message("🎬 Ready for nirob.mp4 streaming with MP4 support")
         self.log_message("✨ Enhanced UI with modern design loaded")
+        
+        if HAVE_JPEG_TURBO:
+            simd = " + Pillow-SIMD" if PILLOW_SIMD else ""
+            self.log_message(f"⚡ JPEG decoder: libjpeg-turbo{simd}")
+        else:
+            self.log_message("⚠️ libjpeg-turbo not detected - JPEG decode will be slow")
     
     def log_message(self, message):
-        """Add message to status log with colors"""
+        """Queue a message for the status log (safe from any thread)"""
         timestamp = time.strftime("%H:%M:%S")
         
-        # Insert timestamp in cyan
-        self.status_text.insert(tk.END, f"[{timestamp}] ", 'timestamp')
-        
         # Color-code different message types
         if message.startswith('✅') or 'OK' in message or 'Connected' in message:
-            self.status_text.insert(tk.END, f"{message}\n", 'success')
+            tag = 'success'
         elif message.startswith('❌') or 'Error' in message or 'failed' in message:
-            self.status_text.insert(tk.END, f"{message}\n", 'error')
+            tag = 'error'
         elif message.startswith('📤') or 'request' in message.lower():
-            self.status_text.insert(tk.END, f"{message}\n", 'request')
+            tag = 'request'
         elif message.startswith('📨') or 'response' in message.lower():
-            self.status_text.insert(tk.END, f"{message}\n", 'response')
+            tag = 'response'
         else:
-            self.status_text.insert(tk.END, f"{message}\n", 'info')
+            tag = 'info'
         
-        # Configure text tags for colors
-        self.status_text.tag_configure('timestamp', foreground='#89b4fa')
-        self.status_text.tag_configure('success', foreground='#a6e3a1')
-        self.status_text.tag_configure('error', foreground='#f38ba8')
-        self.status_text.tag_configure('request', foreground='#fab387')
-        self.status_text.tag_configure('response', foreground='#cba6f7')
-        self.status_text.tag_configure('info', foreground='#cdd6f4')
-        
-        self.status_text.see(tk.END)
-        self.root.update_idletasks()
+        self.log_q.append((timestamp, message, tag))
+    
+    def _flush_log(self):
+        """Tk thread: append queued log lines in one batch, then reschedule"""
+        if self.log_q:
+            while self.log_q:
+                timestamp, message, tag = self.log_q.popleft()
+                self.status_text.insert(tk.END, f"[{timestamp}] ", 'timestamp')
+                self.status_text.insert(tk.END, f"{message}\n", tag)
+            self.status_text.see(tk.END)
+        
+        self.root.after(100, self._flush_log)
     
     def connect_to_server(self):
         """Connect to RTSP server"""
@@ -320,6 +418,13 @@ class RTSPClient:
             # Create RTSP socket
             self.rtsp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.rtsp_socket.connect((self.server_addr, self.server_port))
+            self.rtsp_reader = self.rtsp_socket.makefile('rb')  # Buffered reply reader
+            self.build_request_templates()
+            
+            # One reply reader for the whole connection; it blocks without a
+            # timeout (a timed-out makefile reader can never be read again)
+            threading.Thread(target=self.recv_rtsp_reply, args=(self.rtsp_reader,),
+                             daemon=True).start()
             
             self.log_message(f"✅ Connected to RTSP server: {self.server_addr}:{self.server_port}")
             self.log_message(f"🎯 Ready to stream {self.filename} with enhanced quality")
@@ -332,107 +437,128 @@ class RTSPClient:
             self.log_message(f"❌ Connection failed: {e}")
             messagebox.showerror("Connection Error", f"Failed to connect to server:\n{e}")
     
+    def build_request_templates(self):
+        """Pre-render RTSP requests for the connected server and file"""
+        url = f"rtsp://{self.server_addr}:{self.server_port}/{self.filename}"
+        url = url.replace('%', '%%')  # Literal in the %-template (e.g. "my%20video.mp4")
+        
+        self.request_templates = {}
+        for method, (header, needs_session) in self.REQUESTS.items():
+            lines = (f"{method} {url} {self.RTSP_VER}", "CSeq: %d", header, "", "")
+            self.request_templates[method] = ("\r\n".join(lines).encode(), needs_session)
+    
     def send_rtsp_request(self, request_code):
         """Send RTSP request to server"""
-        if request_code == "SETUP" and self.rtsp_socket:
-            threading.Thread(target=self.recv_rtsp_reply, daemon=True).start()
-            
-            self.seq_num += 1
-            request = (f"SETUP rtsp://{self.server_addr}:{self.server_port}/{self.filename} {self.RTSP_VER}\r\n"
-                      f"CSeq: {self.seq_num}\r\n"
-                      f"Transport: RTP/UDP;client_port={self.rtp_port}\r\n\r\n")
-            
-            self.rtsp_socket.send(request.encode())
-            self.request_sent = "SETUP"
-            self.log_message(f"📤 RTSP SETUP request sent")
-            
-        elif request_code == "PLAY" and self.rtsp_socket:
-            self.seq_num += 1
-            request = (f"PLAY rtsp://{self.server_addr}:{self.server_port}/{self.filename} {self.RTSP_VER}\r\n"
-                      f"CSeq: {self.seq_num}\r\n"
-                      f"Session: {self.session_id}\r\n\r\n")
-            
-            self.rtsp_socket.send(request.encode())
-            self.request_sent = "PLAY"
-            self.log_message(f"📤 RTSP PLAY request sent")
-            
-        elif request_code == "PAUSE" and self.rtsp_socket:
-            self.seq_num += 1
-            request = (f"PAUSE rtsp://{self.server_addr}:{self.server_port}/{self.filename} {self.RTSP_VER}\r\n"
-                      f"CSeq: {self.seq_num}\r\n"
-                      f"Session: {self.session_id}\r\n\r\n")
-            
-            self.rtsp_socket.send(request.encode())
-            self.request_sent = "PAUSE"
-            self.log_message(f"📤 RTSP PAUSE request sent")
-            
-        elif request_code == "TEARDOWN" and self.rtsp_socket:
-            self.seq_num += 1
-            request = (f"TEARDOWN rtsp://{self.server_addr}:{self.server_port}/{self.filename} {self.RTSP_VER}\r\n"
-                      f"CSeq: {self.seq_num}\r\n"
-                      f"Session: {self.session_id}\r\n\r\n")
-            
-            self.rtsp_socket.send(request.encode())
-            self.request_sent = "TEARDOWN"
-            self.log_message(f"📤 RTSP TEARDOWN request sent")
+        entry = self.request_templates.get(request_code)
+        if entry is None or not self.rtsp_socket:
+            return
+        template, needs_session = entry
+        
+        if request_code == "SETUP":
+            # Bind the RTP socket first so SETUP can carry its real port
+            if not self.open_rtp_socket():
+                return
+        
+        self.seq_num += 1
+        value = (self.session_id or b'') if needs_session else self.rtp_port
+        
+        self.rtsp_socket.send(template % (self.seq_num, value))
+        self.request_sent = request_code
+        self.log_message(f"📤 RTSP {request_code} request sent")
+    
+    def open_rtp_socket(self):
+        """
+        Create the RTP socket on a kernel-assigned free port
+        
+        Returns:
+            bool: True if the socket is bound and ready
+        """
+        if self.rtp_socket:
+            self.rtp_socket.close()
+        
+        try:
+            self.rtp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.rtp_socket.setblocking(False)
+            self.rtp_socket.bind(('', 0))
+            self.rtp_port = self.rtp_socket.getsockname()[1]
+            self.rtp_connected = False
+            self.set_rtp_rcvbuf()
+            return True
+        except socket.error as e:
+            self.log_message(f"❌ Could not bind RTP socket: {e}")
+            self.rtp_socket = None
+            return False
     
-    def recv_rtsp_reply(self):
-        """Receive RTSP reply from server"""
+    def read_rtsp_reply(self, reader):
+        """
+        Read one complete RTSP reply through the buffered reader
+        
+        Returns:
+            bytes: Status line, headers and body, or b'' if the server closed
+        """
+        lines = []
+        content_length = 0
+        while True:
+            line = reader.readline()
+            if not line:
+                return b''
+            lines.append(line)
+            if line in (b'\r\n', b'\n'):
+                break
+            if line[:15].lower() == b'content-length:':
+                # A malformed length skips the header instead of ending the reply thread
+                try:
+                    content_length = max(int(line[15:]), 0)
+                except ValueError:
+                    content_length = 0
+        
+        if content_length:
+            lines.append(reader.read(content_length))
+        return b''.join(lines)
+    
+    def recv_rtsp_reply(self, reader):
+        """
+        Receive RTSP replies from the server until the connection closes
+        
+        Args:
+            reader: Buffered reader of the connection this thread serves
+        """
         try:
-            while self.rtsp_socket:
+            while reader is self.rtsp_reader:
                 try:
-                    self.rtsp_socket.settimeout(5.0)  # 5 second timeout
-                    reply = self.rtsp_socket.recv(1024).decode()
-                    if reply:
-                        self.parse_rtsp_reply(reply)
-                    else:
-                        break
-                except socket.timeout:
-                    self.log_message("⚠️ RTSP reply timeout")
-                    break
-                except socket.error as e:
-                    if "[WinError 10048]" in str(e):
-                        self.log_message("❌ Port conflict - retrying with new port")
-                        self.rtp_port = self.get_available_port(self.rtp_port + 1)
-                    else:
+                    reply = self.read_rtsp_reply(reader)
+                except (socket.error, ValueError) as e:
+                    if reader is self.rtsp_reader:  # Not closed by on_closing()
                         self.log_message(f"❌ RTSP socket error: {e}")
                     break
+                if not reply:
+                    if reader is self.rtsp_reader:
+                        self.log_message("🔌 RTSP connection closed by server")
+                    break
+                self.parse_rtsp_reply(reply)
                     
         except Exception as e:
             self.log_message(f"❌ RTSP reply error: {e}")
+        finally:
+            reader.close()  # Only this thread reads, so only it may close
     
     def parse_rtsp_reply(self, reply):
-        """Parse RTSP reply"""
-        lines = reply.split('\n')
-        seq_num = self.seq_num
-        session_id = self.session_id
+        """
+        Parse RTSP reply
         
+        Args:
+            reply (bytes): Raw reply from the server
+        """
         # Extract response code
-        if lines[0].split()[1] == '200':
+        status = _RE_STATUS.match(reply)
+        if status and status.group(1) == b'200':
             # Extract session ID for SETUP response
             if self.request_sent == "SETUP":
-                for line in lines:
-                    if line.startswith('Session:'):
-                        self.session_id = line.split(' ')[1]
-                        break
+                session = _RE_SESSION.search(reply)
+                if session:
+                    self.session_id = session.group(1)
                 
-                # Create RTP socket with port retry
-                max_retries = 10
-                for retry in range(max_retries):
-                    try:
-                        self.rtp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                        self.rtp_socket.settimeout(0.5)
-                        self.rtp_socket.bind(('', self.rtp_port))
-                        break  # Success
-                    except socket.error as e:
-                        if self.rtp_socket:
-                            self.rtp_socket.close()
-                        self.rtp_port = self.get_available_port(self.rtp_port + 1)
-                        if retry == max_retries - 1:
-                            self.log_message(f"❌ Could not bind RTP socket: {e}")
-                            return
-                
-                self.log_message(f"📨 RTSP SETUP OK - Session: {self.session_id}")
+                self.log_message(f"📨 RTSP SETUP OK - Session: {(self.session_id or b'').decode()}")
                 
                 # Enable play button
                 self.play_btn.config(state=tk.NORMAL)
@@ -443,17 +569,18 @@ class RTSPClient:
                 self.playing = True
                 
                 # Clear canvas before starting
-                self.video_canvas.delete("all")
-                self.video_canvas.create_text(200, 120, 
-                                            text="🎬 Starting Video Stream...\nReceiving frames...", 
-                                            fill='#a6e3a1', font=('Arial', 12, 'bold'), 
-                                            justify=tk.CENTER)
+                self.show_overlay('starting')
                 
                 # Start RTP receiving thread
                 self.rtp_running = True
                 self.rtp_thread = threading.Thread(target=self.listen_rtp, daemon=True)
                 self.rtp_thread.start()
                 
+                # Start JPEG decoding thread
+                if not self.decode_thread or not self.decode_thread.is_alive():
+                    self.decode_thread = threading.Thread(target=self.decode_frames, daemon=True)
+                    self.decode_thread.start()
+                
                 # Update buttons
                 self.play_btn.config(state=tk.DISABLED)
                 self.pause_btn.config(state=tk.NORMAL)
@@ -462,7 +589,7 @@ class RTSPClient:
             elif self.request_sent == "PAUSE":
                 self.log_message(f"📨 RTSP PAUSE OK")
                 self.playing = False
-                self.rtp_running = False
+                self.stop_rtp()
                 
                 # Update buttons
                 self.play_btn.config(state=tk.NORMAL)
@@ -473,102 +600,325 @@ class RTSPClient:
                 self.teardown_acked = 1
                 
         else:
-            self.log_message(f"❌ RTSP Error: {lines[0]}")
+            status_line = reply.split(b'\r\n', 1)[0].decode('utf-8', 'replace')
+            self.log_message(f"❌ RTSP Error: {status_line}")
+    
+    def set_rtp_rcvbuf(self):
+        """Enlarge the RTP socket receive buffer and report what the kernel granted"""
+        try:
+            self.rtp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.RTP_RCVBUF)
+        except socket.error as e:
+            self.log_message(f"⚠️ Could not set RTP receive buffer: {e}")
+        
+        granted = self.rtp_socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        self.log_message(f"📦 RTP receive buffer: {granted // 1024} KB")
+        if granted < self.RTP_RCVBUF_MIN:
+            self.log_message("⚠️ RTP receive buffer is small - raise net.core.rmem_max "
+                             "(e.g. sysctl -w net.core.rmem_max=12582912) to avoid drops")
     
     def listen_rtp(self):
         """Listen for RTP packets"""
         self.log_message(f"🎥 RTP listening on port {self.rtp_port}")
         
+        rtp_socket = self.rtp_socket
+        
+        self.reset_reassembly()
+        
+        # Block until data arrives or stop_rtp() wakes us; no timeout polling
+        selector = selectors.DefaultSelector()
+        selector.register(rtp_socket, selectors.EVENT_READ)
+        selector.register(self.wake_r, selectors.EVENT_READ)
+        
+        try:
+            while self.rtp_running:
+                for key, _ in selector.select():
+                    if key.fileobj is self.wake_r:
+                        self.drain_wakeups()
+                    else:
+                        self.read_rtp(rtp_socket)
+        except Exception as e:
+            if self.rtp_running:
+                self.log_message(f"❌ RTP receive error: {e}")
+        finally:
+            selector.close()
+        
+        self.log_message(f"⏹️ RTP listening stopped")
+    
+    def read_rtp(self, rtp_socket):
+        """Read the datagrams currently queued on the non-blocking RTP socket"""
         while self.rtp_running:
             try:
-                data, addr = self.rtp_socket.recvfrom(65536)
-                if data and len(data) > 12:  # Valid RTP packet size
-                    try:
-                        # Parse RTP packet
-                        rtp_packet = RTPPacket()
-                        rtp_packet.decode(data)
-                        
-                        # Validate payload
-                        if rtp_packet.payload and len(rtp_packet.payload) > 0:
-                            # Display frame
-                            self.display_frame(rtp_packet.payload)
-                            self.frame_count += 1
-                            
-                            # Update frame counter
-                            self.frame_label.config(text=f"📊 Frame: {self.frame_count}")
-                            
-                            # Log success every 30 frames
-                            if self.frame_count % 30 == 0:
-                                self.log_message(f"✅ Received {self.frame_count} frames")
-                        else:
-                            self.log_message("⚠️ Empty RTP payload")
-                            
-                    except Exception as decode_error:
-                        self.log_message(f"❌ RTP decode error: {decode_error}")
-                        
-            except socket.timeout:
+                if self.rtp_connected:
+                    nbytes = rtp_socket.recv_into(self.rx_buf)
+                else:
+                    nbytes, addr = rtp_socket.recvfrom_into(self.rx_buf)
+                    self.connect_rtp(rtp_socket, addr)
+            except BlockingIOError:
+                return
+            self.handle_rtp_packet(self.rx_view[:nbytes])
+    
+    def connect_rtp(self, rtp_socket, addr):
+        """
+        Connect the RTP socket to the server's sending address
+        
+        A connected UDP socket skips the kernel's per-packet route and
+        socket lookup and ignores datagrams from any other sender.
+        """
+        self.rtp_connected = True  # Only try once per socket
+        try:
+            rtp_socket.connect(addr)
+            self.log_message(f"🔒 RTP socket connected to {addr[0]}:{addr[1]}")
+        except OSError as e:
+            self.log_message(f"⚠️ Could not connect RTP socket: {e}")
+    
+    def stop_rtp(self):
+        """Stop the RTP listener, waking it if it is waiting for packets"""
+        self.rtp_running = False
+        try:
+            self.wake_w.send(b'\0')
+        except OSError:
+            pass  # Wake pipe already full - listener will wake anyway
+    
+    def drain_wakeups(self):
+        """Empty the wake-up socket"""
+        try:
+            while self.wake_r.recv(64):
+                pass
+        except BlockingIOError:
+            pass
+    
+    def reset_reassembly(self):
+        """Forget any partial frame (new stream or sequence restart)"""
+        self.rx_frame = bytearray()
+        self.rx_next_seq = None
+        self.rx_frame_ok = True
+    
+    def handle_rtp_packet(self, data):
+        """
+        Add one RTP datagram to the frame being reassembled, queueing the
+        frame once its marker packet arrives
+        
+        Args:
+            data (memoryview): Datagram in a reused receive buffer
+        """
+        if len(data) > 12:  # Valid RTP packet size
+            try:
+                # Parse RTP header; the payload view is copied once, into
+                # the frame buffer, before the receive buffer is reused
+                seq_num, marker, payload = parse_rtp(data, copy=False)
+                
+                # A missing or reordered fragment spoils the whole frame
+                if self.rx_next_seq is not None and seq_num != self.rx_next_seq:
+                    self.rx_frame_ok = False
+                self.rx_next_seq = (seq_num + 1) & 0xFFFF
+                
+                # A frame must start at the JPEG SOI marker (catches joining mid-frame)
+                if not self.rx_frame and payload[:2] != b'\xff\xd8':
+                    self.rx_frame_ok = False
+                
+                if self.rx_frame_ok:
+                    self.rx_frame += payload
+                
+                if not marker:
+                    return
+                
+                # Last fragment: hand the buffer to the decoder and start a new one
+                frame, frame_ok = self.rx_frame, self.rx_frame_ok
+                self.rx_frame = bytearray()
+                self.rx_frame_ok = True
+                
+                if frame_ok and frame:
+                    if self.put_latest(self.jpeg_q, frame):
+                        self.dropped_frames += 1  # Decoder was behind; skipped a stale frame
+                    self.frame_count += 1  # Shown by _tick on the Tk thread
+                else:
+                    self.dropped_frames += 1  # Lost fragment; frame discarded
+                    
+            except Exception as decode_error:
+                self.log_message(f"❌ RTP decode error: {decode_error}")
+    
+    def _tick(self):
+        """Tk thread: refresh the frame counter and progress log"""
+        counters = (self.frame_count, self.dropped_frames)
+        if counters != self.shown_counters:
+            frame_count, dropped = counters
+            self.frame_label.config(text=f"📊 Frame: {frame_count} | ⏭️ Dropped: {dropped}")
+            
+            # Log success every 30 frames
+            if frame_count // 30 > self.shown_counters[0] // 30:
+                self.log_message(f"✅ Received {frame_count // 30 * 30} frames")
+            
+            self.shown_counters = counters
+        
+        self.root.after(100, self._tick)
+    
+    @staticmethod
+    def put_latest(q, item):
+        """
+        Put without blocking, discarding the oldest entry if the queue is full
+        
+        Returns:
+            bool: True if an older entry was discarded
+        """
+        try:
+            q.put_nowait(item)
+            return False
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+            q.put_nowait(item)
+            return True
+    
+    def decode_frames(self):
+        """Decoder thread: turn queued JPEG payloads into canvas-sized images"""
+        while self.rtp_running:
+            try:
+                frame_data = self.jpeg_q.get(timeout=0.5)
+            except queue.Empty:
                 continue
+            
+            try:
+                image = self.decode_frame(frame_data)
             except Exception as e:
-                if self.rtp_running:
-                    self.log_message(f"❌ RTP receive error: {e}")
+                image = e  # Rendered as an error overlay on the Tk thread
+            
+            if image is not None:
+                self.put_latest(self.frame_q, image)
+    
+    def decode_frame(self, frame_data):
+        """Decode a JPEG frame and resize it to fit the canvas"""
+        # Validate frame data
+        if not frame_data or len(frame_data) < 100:
+            self.log_message("⚠️ Invalid frame data")
+            return None
+        
+        # Check if it's valid JPEG
+        if not frame_data.startswith(b'\xff\xd8'):
+            self.log_message("⚠️ Not a valid JPEG frame")
+            return None
+        
+        # Convert JPEG data to PIL Image, reusing one BytesIO buffer
+        jpeg_io = self.jpeg_io
+        jpeg_io.seek(0)
+        jpeg_io.truncate()
+        jpeg_io.write(frame_data)
+        jpeg_io.seek(0)
+        image = Image.open(jpeg_io)
+        
+        # Resize to fit canvas
+        canvas_width, canvas_height = self.canvas_size
+        if canvas_width <= 1 or canvas_height <= 1:
+            return None
+        
+        # Maintain aspect ratio
+        img_width, img_height = image.size
+        aspect_ratio = img_width / img_height
+        
+        if canvas_width / canvas_height > aspect_ratio:
+            new_height = canvas_height
+            new_width = int(canvas_height * aspect_ratio)
+        else:
+            new_width = canvas_width
+            new_height = int(canvas_width / aspect_ratio)
+        
+        # Bilinear is plenty for a live preview; nearest when barely scaling
+        if abs(new_width - img_width) < 32:
+            resample = Image.Resampling.NEAREST
+        else:
+            resample = Image.Resampling.BILINEAR
+        
+        image = image.resize((new_width, new_height), resample)
+        
+        # Hand Tk a plain RGB block so PhotoImage.paste() is a straight copy
+        # and no pixel conversion runs while the Tk thread holds the GIL
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        return image
+    
+    def _pump_frames(self):
+        """Tk thread: display the newest decoded frame, then reschedule"""
+        frame = None
+        while True:
+            try:
+                frame = self.frame_q.get_nowait()
+            except queue.Empty:
                 break
         
-        self.log_message(f"⏹️ RTP listening stopped")
+        if frame is not None and self.playing:
+            if isinstance(frame, Exception):
+                self.display_error(frame)
+            else:
+                self.display_frame(frame)
+        
+        self.root.after(16, self._pump_frames)
     
-    def display_frame(self, frame_data):
-        """Display video frame on canvas"""
+    def display_frame(self, image):
+        """Display a decoded video frame on canvas"""
         try:
-            # Validate frame data
-            if not frame_data or len(frame_data) < 100:
-                self.log_message("⚠️ Invalid frame data")
-                return
+            canvas_width, canvas_height = self.canvas_size
+            center = (canvas_width//2, canvas_height//2)
             
-            # Check if it's valid JPEG
-            if not frame_data.startswith(b'\xff\xd8'):
-                self.log_message("⚠️ Not a valid JPEG frame")
-                return
+            if self.canvas_img_id is not None and self.photo_size == image.size:
+                # Same geometry: update pixels in place
+                self.photo.paste(image)
+            else:
+                # First frame or resized canvas: new PhotoImage
+                self.photo = ImageTk.PhotoImage(image)
+                self.photo_size = image.size
+                if self.canvas_img_id is None:
+                    self.canvas_img_id = self.video_canvas.create_image(*center, image=self.photo)
+                    self.canvas_img_pos = center
+                else:
+                    self.video_canvas.itemconfigure(self.canvas_img_id, image=self.photo)
             
-            # Convert JPEG data to PIL Image
-            image = Image.open(io.BytesIO(frame_data))
+            if self.canvas_img_pos != center:
+                self.video_canvas.coords(self.canvas_img_id, *center)
+                self.canvas_img_pos = center
             
-            # Resize to fit canvas
-            canvas_width = self.video_canvas.winfo_width()
-            canvas_height = self.video_canvas.winfo_height()
+            # Replace any message overlay with the video
+            if self.active_overlay is not None:
+                self.show_overlay(None)
             
-            if canvas_width > 1 and canvas_height > 1:
-                # Maintain aspect ratio
-                img_width, img_height = image.size
-                aspect_ratio = img_width / img_height
-                
-                if canvas_width / canvas_height > aspect_ratio:
-                    new_height = canvas_height
-                    new_width = int(canvas_height * aspect_ratio)
-                else:
-                    new_width = canvas_width
-                    new_height = int(canvas_width / aspect_ratio)
-                
-                image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                
-                # Convert to PhotoImage
-                photo = ImageTk.PhotoImage(image)
-                
-                # Display on canvas
-                self.video_canvas.delete("all")
-                self.video_canvas.create_image(canvas_width//2, canvas_height//2, image=photo)
-                self.video_canvas.image = photo  # Keep reference
-                
-                # Success indicator (only for first few frames)
-                if self.frame_count < 5:
-                    self.log_message(f"✅ Frame {self.frame_count} displayed ({new_width}x{new_height})")
+            # Success indicator (only for first few frames)
+            if self.frame_count < 5:
+                new_width, new_height = image.size
+                self.log_message(f"✅ Frame {self.frame_count} displayed ({new_width}x{new_height})")
                 
         except Exception as e:
-            self.log_message(f"❌ Frame display error: {e}")
-            # Show error on canvas
-            self.video_canvas.delete("all")
-            self.video_canvas.create_text(200, 120, 
-                                        text=f"❌ Display Error\n{str(e)[:50]}", 
-                                        fill='#f38ba8', font=('Arial', 10, 'bold'), 
-                                        justify=tk.CENTER)
+            self.display_error(e)
+    
+    def on_canvas_configure(self, event):
+        """Remember the new canvas size (read by the decoder thread)"""
+        self.canvas_size = (event.width, event.height)
+    
+    def show_overlay(self, name, text=None):
+        """
+        Show one pre-created canvas message in place of the video
+        
+        Args:
+            name (str): Overlay key, or None to show the video frame
+            text (str): Optional new text for the overlay
+        """
+        canvas = self.video_canvas
+        if text is not None:
+            canvas.itemconfigure(self.overlays[name], text=text)
+        
+        if name != self.active_overlay:
+            if self.active_overlay is not None:
+                canvas.itemconfigure(self.overlays[self.active_overlay], state='hidden')
+            if name is not None:
+                canvas.itemconfigure(self.overlays[name], state='normal')
+            if self.canvas_img_id is not None:
+                canvas.itemconfigure(self.canvas_img_id, state='hidden' if name else 'normal')
+            self.active_overlay = name
+    
+    def display_error(self, error):
+        """Show a frame decode/display error on canvas"""
+        self.log_message(f"❌ Frame display error: {error}")
+        self.show_overlay('error', text=f"❌ Display Error\n{str(error)[:50]}")
     
     # Button event handlers
     def setup_video(self):
@@ -586,17 +936,24 @@ class RTSPClient:
     def stop_video(self):
         """Stop video stream"""
         self.playing = False
-        self.rtp_running = False
+        self.stop_rtp()
         self.send_rtsp_request("TEARDOWN")
         
         # Reset UI with colorful message
-        self.video_canvas.delete("all")
-        self.video_canvas.create_text(200, 120, text="📺 Video Stopped\n🔄 Ready for new stream", 
-                                    fill='#fab387', font=('Arial', 12, 'bold'), justify=tk.CENTER)
+        self.show_overlay('stopped')
         
         self.frame_count = 0
+        self.dropped_frames = 0
         self.frame_label.config(text="Frame: 0")
         
+        # Discard frames still in flight
+        for q in (self.jpeg_q, self.frame_q):
+            while not q.empty():
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    break
+        
         # Reset buttons
         self.setup_btn.config(state=tk.NORMAL)
         self.play_btn.config(state=tk.DISABLED)
@@ -624,11 +981,15 @@ class RTSPClient:
     def on_closing(self):
         """Handle window closing"""
         self.playing = False
-        self.rtp_running = False
+        self.stop_rtp()
         
         # Cleanup sockets
         try:
+            # Detach the reply thread's reader, then wake its blocked read
+            # with a shutdown; the thread closes the reader itself
+            self.rtsp_reader = None
             if self.rtsp_socket:
+                self.rtsp_socket.shutdown(socket.SHUT_RDWR)
                 self.rtsp_socket.close()
                 self.rtsp_socket = None
         except:
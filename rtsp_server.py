@@ -3,17 +3,213 @@ RTSP Server Implementation
 Handles RTSP protocol commands and RTP video streaming
 """
 
+import collections
+import re
+import secrets
 import socket
+import selectors
 import threading
 import time
+import logging
 import os
-from rtp_packet import RTPVideoStream
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from rtp_packet import RTPPacket, RTPVideoStream
+from rtp_batch import SendSlab
 try:
     from enhanced_video_stream import EnhancedVideoStream as VideoStream
-    print("🎬 Enhanced video support enabled (MP4 + MJPEG)")
+    ENHANCED_VIDEO = True
 except ImportError:
     from video_stream import VideoStream
-    print("📺 Basic video support (MJPEG only)")
+    ENHANCED_VIDEO = False
+
+logger = logging.getLogger(__name__)
+
+class FrameCache:
+    """Frame payloads per video file, shared by all sessions streaming it"""
+    
+    def __init__(self, max_bytes=256 << 20):
+        self.max_bytes = max_bytes  # Total payload budget across all videos
+        self.total_bytes = 0
+        # (path, mtime_ns, size): (list of frame payloads, payload bytes),
+        # least recently used first
+        self.videos = collections.OrderedDict()
+        self.collecting = set()  # Keys a prefetcher is currently collecting
+        self.lock = threading.Lock()
+    
+    def key(self, video_path):
+        """
+        Cache key for a video file as it is now on disk
+        
+        Entries cached from an earlier version of the file are dropped.
+        
+        Returns:
+            tuple: (path, mtime_ns, size)
+        """
+        st = os.stat(video_path)
+        key = (video_path, st.st_mtime_ns, st.st_size)
+        with self.lock:
+            for stale in [k for k in self.videos if k[0] == video_path and k != key]:
+                self.total_bytes -= self.videos.pop(stale)[1]
+        return key
+    
+    def get(self, key):
+        """Cached packets for a video, or None"""
+        with self.lock:
+            entry = self.videos.get(key)
+            if entry is None:
+                return None
+            self.videos.move_to_end(key)
+            return entry[0]
+    
+    def claim(self, key):
+        """
+        Reserve collecting a video's first pass for one prefetcher
+        
+        Returns:
+            bool: False if it is already cached or being collected elsewhere
+        """
+        with self.lock:
+            if key in self.videos or key in self.collecting:
+                return False
+            self.collecting.add(key)
+            return True
+    
+    def release(self, key):
+        """Drop a claim once its collection is published or abandoned"""
+        with self.lock:
+            self.collecting.discard(key)
+    
+    def publish(self, key, frames, nbytes):
+        """
+        Store a complete pass over a video, evicting least recently used
+        videos to make room
+        
+        Returns:
+            bool: True if the packets were cached
+        """
+        with self.lock:
+            if key in self.videos or nbytes > self.max_bytes:
+                return False
+            while self.total_bytes + nbytes > self.max_bytes:
+                self.total_bytes -= self.videos.popitem(last=False)[1][1]
+            self.videos[key] = (frames, nbytes)
+            self.total_bytes += nbytes
+            return True
+
+frame_cache = FrameCache()
+
+class FramePrefetcher:
+    """Reads a session's frames one step ahead of the RTP sender"""
+    
+    def __init__(self, video_stream, cache_key, depth=2):
+        """
+        Args:
+            video_stream: Opened VideoStream to read from
+            cache_key (tuple): frame_cache key for publishing the first full pass
+            depth (int): Frames read ahead (bounds memory)
+        """
+        self.video_stream = video_stream
+        self.cache_key = cache_key
+        self.frames = queue.Queue(maxsize=depth)  # Frame bytes, None at each loop-back
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    
+    def run(self):
+        """Decode frames into the queue, looping the video until stopped"""
+        # Only one prefetcher per video collects its first pass
+        collected = [] if frame_cache.claim(self.cache_key) else None
+        collected_bytes = 0
+        try:
+            while not self.stopped.is_set():
+                frame_data = self.video_stream.get_next_frame()
+                if frame_data is None:
+                    # End of video, loop back and publish the complete first pass
+                    self.video_stream.reset()
+                    if collected and frame_cache.publish(self.cache_key, collected, collected_bytes):
+                        logger.info("🗃️ Cached %d frames of %s", len(collected), self.cache_key[0])
+                    if collected is not None:
+                        frame_cache.release(self.cache_key)
+                    collected = None
+                elif len(frame_data) < 100:
+                    logger.warning("⚠️ Invalid frame data skipped")
+                    continue
+                elif collected is not None:
+                    collected.append(frame_data)
+                    collected_bytes += len(frame_data)
+                    if collected_bytes > frame_cache.max_bytes:
+                        frame_cache.release(self.cache_key)
+                        collected = None  # Too large to cache
+                
+                self.put(frame_data)
+        except Exception as e:
+            if not self.stopped.is_set():
+                logger.error("❌ Frame prefetch error: %s", e)
+        finally:
+            if collected is not None:
+                frame_cache.release(self.cache_key)  # Stopped mid-pass
+    
+    def put(self, frame_data):
+        """Block until the sender makes room, unless stopped meanwhile"""
+        while not self.stopped.is_set():
+            try:
+                self.frames.put(frame_data, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+    
+    def stop(self):
+        """Stop reading ahead (the thread exits after its current frame)"""
+        self.stopped.set()
+
+# Header scanners run on the raw request bytes (no decode, no line list)
+_RE_HEADER = re.compile(rb'^(CSeq|Session|Transport)[ \t]*:[ \t]*([^\r\n]*)', re.M | re.I)
+_RE_CLIENT_PORT = re.compile(rb'client_port=(\d+)')
+
+class RTSPRequest:
+    """Fields the server uses from one RTSP request, extracted in a single scan"""
+    
+    def __init__(self, method, url, cseq=0, client_port=None, session_id=None):
+        self.method = method            # bytes, e.g. b'SETUP'
+        self.url = url                  # str
+        self.cseq = cseq                # int (0 if missing)
+        self.client_port = client_port  # int from Transport, or None
+        self.session_id = session_id    # bytes from Session (without ;timeout=), or None
+    
+    @classmethod
+    def parse(cls, request):
+        """
+        Parse raw request bytes
+        
+        Args:
+            request (bytes): One complete request, headers included
+            
+        Returns:
+            RTSPRequest: Parsed request, or None if the request line is malformed
+        """
+        # Parse request line (up to the first line break)
+        end = request.find(b'\n')
+        request_line = (request if end < 0 else request[:end]).split()
+        if len(request_line) < 3:
+            return None
+        
+        req = cls(request_line[0], request_line[1].decode('utf-8', 'replace'))
+        
+        # One pass over the header block for everything the handlers need
+        for match in _RE_HEADER.finditer(request, end + 1):
+            name = match.group(1).lower()
+            value = match.group(2).strip()
+            if name == b'cseq':
+                req.cseq = int(value) if value.isdigit() else 0
+            elif name == b'session':
+                req.session_id = value.split(b';', 1)[0].strip()
+            else:
+                port = _RE_CLIENT_PORT.search(value)
+                if port:
+                    req.client_port = int(port.group(1))
+        
+        return req
 
 class RTSPServer:
     """RTSP Streaming Server"""
@@ -23,178 +219,337 @@ class RTSPServer:
     # RTSP Response Codes
     OK = 200
     FILE_NOT_FOUND = 404
+    SESSION_NOT_FOUND = 454
     CON_ERR = 500
+    SERVICE_UNAVAILABLE = 503
+    
+    VIDEO_RESCAN_INTERVAL = 1.0  # Min seconds between rescans for unknown files
+    MAX_CLIENTS = 128  # RTSP handler threads; further connections are refused with 503
+    IDLE_TIMEOUT = 60.0  # Seconds a connection without a set-up session may stay silent
+    MAX_REQUEST_SIZE = 64 * 1024  # Drop clients whose headers never terminate
     
-    def __init__(self, port=8554):
+    FRAME_PERIOD = 1.0 / 30.0  # Seconds between RTP frames
+    RTP_PAYLOAD_SIZE = 1400    # Max payload bytes per RTP packet; keeps datagrams under
+                               # a 1500-byte MTU (None = whole frame, IP-fragmented)
+    
+    def __init__(self, port=8554, sndbuf=8 << 20):
         self.port = port
+        self.sndbuf = sndbuf  # RTP socket send buffer (kernel caps it at net.core.wmem_max)
         self.server_socket = None
         self.clients = {}  # client_addr: ClientSession
+        self.sessions_by_id = {}  # session_id: ClientSession
+        self.clients_lock = threading.Lock()  # Guards clients, sessions_by_id and active_clients
+        self.active_clients = 0  # Connections handed to the pool and not yet closed
+        self.session_pool = SessionPool()
+        
+        # Handler threads aren't daemons, so whoever runs the server must
+        # call stop() before exiting (as __main__ does)
+        self.executor = ThreadPoolExecutor(max_workers=self.MAX_CLIENTS, thread_name_prefix="rtsp")
+        self.video_index = {}  # filename: path servable by SETUP
+        self.video_index_time = 0.0
         self.running = False
         
+        # RTSP method: handler(req, session)
+        self.handlers = {
+            b'SETUP': self.handle_setup,
+            b'PLAY': self.handle_play,
+            b'PAUSE': self.handle_pause,
+            b'TEARDOWN': self.handle_teardown,
+        }
+        
+        # Pre-encoded responses; only the numbers are filled in per reply
+        ok_line = b"%s %d OK\r\n" % (self.RTSP_VER.encode(), self.OK)
+        self.setup_template = (ok_line + b"CSeq: %d\r\n"
+                               b"Transport: RTP/UDP;client_port=%d-%d;server_port=%d-%d\r\n"
+                               b"Session: %d\r\n\r\n")
+        self.session_template = ok_line + b"CSeq: %d\r\nSession: %d\r\n\r\n"
+        self.status_templates = {
+            code: b"%s %d %s\r\nCSeq: %%d\r\n\r\n" % (self.RTSP_VER.encode(), code, text)
+            for code, text in ((self.OK, b"OK"),
+                               (self.FILE_NOT_FOUND, b"Not Found"),
+                               (self.SESSION_NOT_FOUND, b"Session Not Found"),
+                               (self.CON_ERR, b"Internal Server Error"),
+                               (self.SERVICE_UNAVAILABLE, b"Service Unavailable"))
+        }
+        
     def start(self):
         """Start RTSP server"""
         try:
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.server_socket.bind(('', self.port))
-            self.server_socket.listen(5)
+            self.server_socket.listen(socket.SOMAXCONN)
+            self.server_socket.setblocking(False)
             self.running = True
             
-            print(f"🎬 RTSP Server started on port {self.port}")
-            print("Available videos:")
+            logger.info("🎬 RTSP Server started on port %d", self.port)
+            if ENHANCED_VIDEO:
+                logger.info("🎬 Enhanced video support enabled (MP4 + MJPEG)")
+            else:
+                logger.info("📺 Basic video support (MJPEG only)")
+            logger.info("Available videos:")
             
-            # Check videos folder
-            if os.path.exists('videos'):
-                for video in os.listdir('videos'):
-                    if video.lower().endswith(('.mjpeg', '.mp4', '.avi', '.mov')):
-                        video_type = "MP4" if video.lower().endswith(('.mp4', '.avi', '.mov')) else "MJPEG"
-                        print(f"  - rtsp://localhost:{self.port}/{video} [{video_type}]")
+            self.scan_videos()
+            for video in self.video_index:
+                if video.lower().endswith(('.mjpeg', '.mp4', '.avi', '.mov')):
+                    video_type = "MJPEG" if video.lower().endswith('.mjpeg') else "MP4"
+                    logger.info("  - rtsp://localhost:%d/%s [%s]", self.port, video, video_type)
             
-            # Check root directory for MP4 files
-            for file in os.listdir('.'):
-                if file.lower().endswith(('.mp4', '.avi', '.mov')):
-                    print(f"  - rtsp://localhost:{self.port}/{file} [MP4]")
+            # Wait for readiness, then accept every pending connection per
+            # wakeup; the timeout lets stop() end the loop
+            selector = selectors.DefaultSelector()
+            selector.register(self.server_socket, selectors.EVENT_READ)
             
             while self.running:
                 try:
-                    client_socket, client_addr = self.server_socket.accept()
-                    print(f"📱 Client connected: {client_addr}")
+                    if not selector.select(timeout=1.0):
+                        continue
                     
-                    # Handle client in separate thread
-                    client_thread = threading.Thread(
-                        target=self.handle_client,
-                        args=(client_socket, client_addr),
-                        daemon=True
-                    )
-                    client_thread.start()
+                    while self.running:
+                        try:
+                            client_socket, client_addr = self.server_socket.accept()
+                        except BlockingIOError:
+                            break  # Backlog drained
+                        client_socket.setblocking(True)
+                        self.set_client_nodelay(client_socket)
+                        logger.info("📱 Client connected: %s", client_addr)
+                        
+                        with self.clients_lock:
+                            busy = self.active_clients >= self.MAX_CLIENTS
+                            if not busy:
+                                self.active_clients += 1
+                        if busy:
+                            # Refuse rather than queue behind handlers that may never free up
+                            logger.warning("⚠️ All %d client handlers busy - refusing %s",
+                                           self.MAX_CLIENTS, client_addr)
+                            self.refuse_client(client_socket)
+                            continue
+                        
+                        # Handle client on the bounded worker pool
+                        self.executor.submit(self.handle_client, client_socket, client_addr)
                     
-                except socket.error:
+                except (socket.error, ValueError):
                     if self.running:
-                        print("❌ Server socket error")
+                        logger.error("❌ Server socket error")
+            
+            selector.close()
                         
         except Exception as e:
-            print(f"❌ Server start error: {e}")
+            logger.error("❌ Server start error: %s", e)
         finally:
             self.stop()
     
+    def set_client_nodelay(self, client_socket):
+        """Send small RTSP replies immediately instead of waiting on Nagle / delayed ACKs"""
+        try:
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if hasattr(socket, 'TCP_QUICKACK'):  # Linux only
+                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+        except socket.error as e:
+            logger.warning("⚠️ Could not set TCP_NODELAY: %s", e)
+    
+    def refuse_client(self, client_socket):
+        """Answer 503 and close a connection there is no free handler for"""
+        try:
+            client_socket.sendall(self.generate_response(self.SERVICE_UNAVAILABLE, 0))
+        except socket.error:
+            pass
+        finally:
+            client_socket.close()
+    
     def handle_client(self, client_socket, client_addr):
         """Handle individual client connection"""
-        session = ClientSession(client_socket, client_addr)
-        self.clients[client_addr] = session
+        session = self.session_pool.acquire(client_socket, client_addr)
+        with self.clients_lock:
+            self.clients[client_addr] = session
+        
+        chunk = bytearray(4096)
+        chunk_view = memoryview(chunk)
+        rx = session.rx
+        
+        # Each connection holds a pool worker, so don't let silent ones keep it
+        client_socket.settimeout(self.IDLE_TIMEOUT)
         
         try:
             while self.running:
-                # Receive RTSP request
-                request = client_socket.recv(1024).decode('utf-8')
-                if not request:
+                # Accumulate until at least one complete request has arrived
+                try:
+                    n = client_socket.recv_into(chunk)
+                except socket.timeout:
+                    if session.state != "INIT":
+                        continue  # Clients send nothing while a set-up session streams
+                    logger.info("⌛ Closing idle connection from %s", client_addr)
                     break
+                if not n:
+                    break
+                rx += chunk_view[:n]
                 
-                print(f"📨 RTSP Request from {client_addr}:")
-                print(request.strip())
-                
-                # Parse and handle request
-                response = self.parse_rtsp_request(request, session)
+                # Handle every complete request (pipelined requests included),
+                # keeping any partial one for the next read
+                while (end := rx.find(b'\r\n\r\n')) != -1:
+                    request = bytes(rx[:end + 4])
+                    del rx[:end + 4]
+                    
+                    logger.debug("📨 RTSP Request from %s: %r", client_addr, request)
+                    
+                    # Parse and handle request
+                    response = self.parse_rtsp_request(request, session)
+                    
+                    # Send response
+                    client_socket.sendall(response)
+                    logger.debug("📤 RTSP Response to %s: %r", client_addr, response)
                 
-                # Send response
-                client_socket.send(response.encode('utf-8'))
-                print(f"📤 RTSP Response to {client_addr}:")
-                print(response.strip())
+                if len(rx) > self.MAX_REQUEST_SIZE:
+                    logger.warning("⚠️ Oversized RTSP request from %s", client_addr)
+                    break
                 
         except Exception as e:
-            print(f"❌ Client handling error: {e}")
+            logger.error("❌ Client handling error: %s", e)
         finally:
             session.cleanup()
-            if client_addr in self.clients:
-                del self.clients[client_addr]
+            self.unregister_session(session)
+            with self.clients_lock:
+                self.clients.pop(client_addr, None)
+                self.active_clients -= 1
             client_socket.close()
-            print(f"🔌 Client {client_addr} disconnected")
+            self.session_pool.release(session)
+            logger.info("🔌 Client %s disconnected", client_addr)
     
     def parse_rtsp_request(self, request, session):
-        """Parse RTSP request and generate response"""
-        lines = request.strip().split('\n')
-        if not lines:
+        """Parse raw RTSP request bytes and generate response"""
+        req = RTSPRequest.parse(request)
+        if req is None:
             return self.generate_response(self.CON_ERR, session.seq_num)
         
-        # Parse request line
-        request_line = lines[0].split()
-        if len(request_line) < 3:
-            return self.generate_response(self.CON_ERR, session.seq_num)
+        session.seq_num = req.cseq
+        
+        # Dispatch on the method bytes
+        handler = self.handlers.get(req.method)
+        if handler is None:
+            return self.generate_response(self.CON_ERR, req.cseq)
+        
+        # A Session header must name this connection's own session
+        if req.method != b'SETUP' and req.session_id is not None:
+            if not self.owns_session(session, req.session_id):
+                return self.generate_response(self.SESSION_NOT_FOUND, req.cseq)
+        
+        return handler(req, session)
+    
+    def owns_session(self, session, session_id):
+        """True if the Session header value session_id belongs to session"""
+        if not session_id.isdigit():
+            return False
+        with self.clients_lock:
+            return self.sessions_by_id.get(int(session_id)) is session
+    
+    def register_session(self, session):
+        """Give session a fresh unguessable ID (replacing any previous one)"""
+        with self.clients_lock:
+            self.sessions_by_id.pop(session.session_id, None)
+            session_id = secrets.randbits(63)
+            while session_id in self.sessions_by_id:
+                session_id = secrets.randbits(63)
+            session.session_id = session_id
+            self.sessions_by_id[session_id] = session
+    
+    def unregister_session(self, session):
+        """Forget session's ID once the RTSP session ends"""
+        with self.clients_lock:
+            if self.sessions_by_id.get(session.session_id) is session:
+                del self.sessions_by_id[session.session_id]
+    
+    def scan_videos(self):
+        """
+        Rebuild the filename -> path index of servable videos
         
-        method = request_line[0]
-        url = request_line[1]
-        
-        # Extract CSeq
-        cseq = 0
-        for line in lines[1:]:
-            if line.startswith('CSeq:'):
-                cseq = int(line.split(':')[1].strip())
-                break
-        
-        session.seq_num = cseq
-        
-        # Handle different RTSP methods
-        if method == "SETUP":
-            return self.handle_setup(url, lines, session)
-        elif method == "PLAY":
-            return self.handle_play(session)
-        elif method == "PAUSE":
-            return self.handle_pause(session)
-        elif method == "TEARDOWN":
-            return self.handle_teardown(session)
-        else:
-            return self.generate_response(self.CON_ERR, cseq)
-    
-    def handle_setup(self, url, lines, session):
+        Files in videos/ take precedence over MP4 files in the working directory.
+        """
+        index = {}
+        for file in os.listdir('.'):
+            if file.lower().endswith('.mp4') and os.path.isfile(file):
+                index[file] = file
+        if os.path.isdir('videos'):
+            for video in os.listdir('videos'):
+                video_path = os.path.join('videos', video)
+                if os.path.isfile(video_path):
+                    index[video] = video_path
+        
+        self.video_index = index  # Swapped whole; readers never see a partial index
+        self.video_index_time = time.monotonic()
+        return index
+    
+    def find_video(self, filename):
+        """Path for a requested filename, rescanning (rate-limited) on a miss"""
+        video_path = self.video_index.get(filename)
+        if video_path is None and time.monotonic() - self.video_index_time > self.VIDEO_RESCAN_INTERVAL:
+            video_path = self.scan_videos().get(filename)
+        return video_path
+    
+    def handle_setup(self, req, session):
         """Handle RTSP SETUP request"""
         try:
             # Extract filename from URL
-            filename = url.split('/')[-1]
-            video_path = os.path.join('videos', filename)
+            filename = req.url.split('/')[-1]
+            video_path = self.find_video(filename)
+            if video_path is None:
+                return self.generate_response(self.FILE_NOT_FOUND, session.seq_num)
             
-            # Check for MP4 file in root directory
-            if not os.path.exists(video_path):
-                # Check if it's an MP4 file in the root directory
-                root_path = filename
-                if os.path.exists(root_path) and filename.lower().endswith('.mp4'):
-                    video_path = root_path
-                    print(f"📁 Found MP4 file in root: {video_path}")
-                else:
-                    return self.generate_response(self.FILE_NOT_FOUND, session.seq_num)
+            # Client RTP port from the Transport header
+            client_rtp_port = req.client_port or 25000  # Default
             
-            # Extract client RTP port
-            client_rtp_port = 25000  # Default
-            for line in lines:
-                if 'client_port=' in line:
-                    port_info = line.split('client_port=')[1].split('-')[0]
-                    client_rtp_port = int(port_info)
-                    break
+            # A repeated SETUP replaces the previous stream: stop its sender
+            # and prefetcher and close its socket and file first
+            session.cleanup()
+            thread = session.streaming_thread
+            if thread and thread.is_alive():
+                thread.join(timeout=1.0)
             
             # Setup video stream
             session.video_stream = VideoStream(video_path)
+            session.cache_key = frame_cache.key(video_path)
+            session.cache_index = 0
             session.rtp_stream = RTPVideoStream()
             session.client_rtp_port = client_rtp_port
+            session.rtp_dest = (session.addr[0], client_rtp_port)
             session.server_rtp_port = 25000
             
             # Generate session ID
-            session.session_id = int(time.time())
+            self.register_session(session)
             
-            # Create RTP socket
+            # Create RTP socket with room for whole-frame bursts
             session.rtp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.set_rtp_sndbuf(session.rtp_socket)
             
-            response = (f"{self.RTSP_VER} {self.OK} OK\r\n"
-                       f"CSeq: {session.seq_num}\r\n"
-                       f"Transport: RTP/UDP;client_port={client_rtp_port}-{client_rtp_port+1};"
-                       f"server_port={session.server_rtp_port}-{session.server_rtp_port+1}\r\n"
-                       f"Session: {session.session_id}\r\n\r\n")
+            # Fix the peer so sends skip the per-call address handling and
+            # route lookup (the kernel caches the route on the socket)
+            session.rtp_socket.connect(session.rtp_dest)
+            
+            response = self.setup_template % (
+                session.seq_num, client_rtp_port, client_rtp_port + 1,
+                session.server_rtp_port, session.server_rtp_port + 1, session.session_id)
             
             session.state = "READY"
             return response
             
         except Exception as e:
-            print(f"❌ SETUP error: {e}")
+            logger.error("❌ SETUP error: %s", e)
             return self.generate_response(self.CON_ERR, session.seq_num)
     
-    def handle_play(self, session):
+    def set_rtp_sndbuf(self, rtp_socket):
+        """Enlarge an RTP socket's send buffer and log what the kernel granted"""
+        try:
+            rtp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
+        except socket.error as e:
+            logger.warning("⚠️ Could not set RTP send buffer: %s", e)
+            return
+        
+        granted = rtp_socket.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+        logger.debug("📦 RTP send buffer: %d KB", granted // 1024)
+        if granted < self.sndbuf:
+            logger.warning("⚠️ RTP send buffer was capped - raise net.core.wmem_max "
+                           "(e.g. sysctl -w net.core.wmem_max=12582912)")
+    
+    def handle_play(self, req, session):
         """Handle RTSP PLAY request"""
         if session.state != "READY" and session.state != "PLAYING":
             return self.generate_response(self.CON_ERR, session.seq_num)
@@ -210,91 +565,106 @@ class RTSPServer:
             )
             session.streaming_thread.start()
         
-        response = (f"{self.RTSP_VER} {self.OK} OK\r\n"
-                   f"CSeq: {session.seq_num}\r\n"
-                   f"Session: {session.session_id}\r\n\r\n")
-        
-        return response
+        return self.session_template % (session.seq_num, session.session_id)
     
-    def handle_pause(self, session):
+    def handle_pause(self, req, session):
         """Handle RTSP PAUSE request"""
-        session.state = "READY"
+        if session.session_id is None:  # No SETUP yet
+            return self.generate_response(self.SESSION_NOT_FOUND, session.seq_num)
         
-        response = (f"{self.RTSP_VER} {self.OK} OK\r\n"
-                   f"CSeq: {session.seq_num}\r\n"
-                   f"Session: {session.session_id}\r\n\r\n")
+        session.state = "READY"
         
-        return response
+        return self.session_template % (session.seq_num, session.session_id)
     
-    def handle_teardown(self, session):
+    def handle_teardown(self, req, session):
         """Handle RTSP TEARDOWN request"""
+        if session.session_id is None:  # No SETUP yet
+            return self.generate_response(self.SESSION_NOT_FOUND, session.seq_num)
+        
         session.state = "INIT"
         session.cleanup()
+        self.unregister_session(session)
         
-        response = (f"{self.RTSP_VER} {self.OK} OK\r\n"
-                   f"CSeq: {session.seq_num}\r\n"
-                   f"Session: {session.session_id}\r\n\r\n")
-        
-        return response
+        return self.session_template % (session.seq_num, session.session_id)
     
     def stream_video(self, session):
         """Stream video via RTP"""
-        print(f"🎥 Starting video stream to {session.addr} on RTP port {session.client_rtp_port}")
+        logger.info("🎥 Starting video stream to %s on RTP port %d", session.addr, session.client_rtp_port)
+        
+        # Frames shared by every session on this video, once the first
+        # full pass has been cached; until then decode them one frame ahead
+        # (the prefetcher outlives PAUSE so no frames are lost on resume)
+        cached = frame_cache.get(session.cache_key)
+        if cached is None and session.prefetcher is None:
+            session.prefetcher = FramePrefetcher(session.video_stream, session.cache_key)
+        
+        period = self.FRAME_PERIOD
+        next_deadline = time.monotonic() + period
         
         frame_count = 0
         try:
             while session.state == "PLAYING":
-                # Get next frame
-                frame_data = session.video_stream.get_next_frame()
-                if frame_data is None:
-                    # End of video, loop back
-                    session.video_stream.reset()
-                    print(f"🔄 Video loop - sent {frame_count} frames")
-                    continue
-                
-                # Validate frame data
-                if not frame_data or len(frame_data) < 100:
-                    print(f"⚠️ Invalid frame data at frame {frame_count}")
-                    continue
-                
-                # Create RTP packet
-                rtp_packet = session.rtp_stream.create_packet(frame_data, True)
-                encoded_packet = rtp_packet.encode()
+                if cached is not None:
+                    frame_data = cached[session.cache_index]
+                    session.cache_index = (session.cache_index + 1) % len(cached)
+                    if session.cache_index == 0:
+                        logger.debug("🔄 Video loop - sent %d frames", frame_count + 1)
+                else:
+                    # Get next frame, decoded while the previous one was sent
+                    try:
+                        frame_data = session.prefetcher.frames.get(timeout=0.5)
+                    except queue.Empty:
+                        if not session.prefetcher.thread.is_alive():
+                            break  # Reader failed
+                        continue
+                    
+                    if frame_data is None:
+                        # Video looped back; stream from the cache once published
+                        logger.debug("🔄 Video loop - sent %d frames", frame_count)
+                        cached = frame_cache.get(session.cache_key)
+                        if cached is not None:
+                            session.prefetcher.stop()
+                            session.prefetcher = None
+                            session.cache_index = 0
+                        continue
                 
-                # Send RTP packet
+                # Fragment, stamp and send all RTP packets of the frame in one call
+                mtu = self.RTP_PAYLOAD_SIZE or len(frame_data)
                 try:
-                    bytes_sent = session.rtp_socket.sendto(
-                        encoded_packet,
-                        (session.addr[0], session.client_rtp_port)
-                    )
+                    sent = session.rtp_stream.send_frame(session.rtp_socket, frame_data,
+                                                         None, mtu, session.send_slab)
                     frame_count += 1
                     
                     # Log progress every 30 frames
-                    if frame_count % 30 == 0:
-                        print(f"📤 Sent {frame_count} frames ({bytes_sent} bytes/frame)")
+                    if frame_count % 30 == 0 and logger.isEnabledFor(logging.DEBUG):
+                        bytes_sent = len(frame_data) + sent * RTPPacket.HEADER_SIZE
+                        logger.debug("📤 Sent %d frames (%d bytes/frame)", frame_count, bytes_sent)
                         
+                except ConnectionRefusedError:
+                    # ICMP port unreachable reported on the connected socket
+                    logger.info("🔌 RTP port %s closed by client - stopping stream", session.rtp_dest)
+                    break
                 except Exception as send_error:
-                    print(f"❌ Send error at frame {frame_count}: {send_error}")
+                    logger.error("❌ Send error at frame %d: %s", frame_count, send_error)
                     break
                 
-                # Control frame rate (30 FPS = ~33ms per frame)
-                time.sleep(0.033)
+                # Control frame rate against absolute deadlines so send
+                # time doesn't accumulate as drift (30 FPS)
+                delay = next_deadline - time.monotonic()
+                next_deadline += period
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -period:
+                    next_deadline = time.monotonic() + period  # Resync after a stall
                 
         except Exception as e:
-            print(f"❌ Streaming error: {e}")
+            logger.error("❌ Streaming error: %s", e)
         
-        print(f"⏹️ Video stream stopped for {session.addr} - Total frames sent: {frame_count}")
+        logger.info("⏹️ Video stream stopped for %s - Total frames sent: %d", session.addr, frame_count)
     
     def generate_response(self, code, cseq):
-        """Generate RTSP response"""
-        status_text = {
-            self.OK: "OK",
-            self.FILE_NOT_FOUND: "Not Found", 
-            self.CON_ERR: "Internal Server Error"
-        }
-        
-        return (f"{self.RTSP_VER} {code} {status_text[code]}\r\n"
-                f"CSeq: {cseq}\r\n\r\n")
+        """Generate RTSP status-only response"""
+        return self.status_templates[code] % cseq
     
     def stop(self):
         """Stop RTSP server"""
@@ -302,16 +672,31 @@ class RTSPServer:
         if self.server_socket:
             self.server_socket.close()
         
-        # Cleanup all client sessions
-        for session in self.clients.values():
+        # Cleanup all client sessions (snapshot; handler threads may still exit)
+        with self.clients_lock:
+            sessions = list(self.clients.values())
+        for session in sessions:
             session.cleanup()
+            try:
+                session.socket.shutdown(socket.SHUT_RDWR)  # Wake its blocked recv
+            except (OSError, AttributeError):
+                pass
+        
+        # Pool threads aren't daemons: drop connections still waiting for a
+        # handler so interpreter exit doesn't wait on them
+        self.executor.shutdown(wait=False, cancel_futures=True)
         
-        print("⏹️ RTSP Server stopped")
+        logger.info("⏹️ RTSP Server stopped")
 
 class ClientSession:
     """Client session management"""
     
     def __init__(self, socket, addr):
+        self.send_slab = SendSlab()  # Kept across reuse by SessionPool
+        self.reset(socket, addr)
+    
+    def reset(self, socket, addr):
+        """Return to the freshly-connected state for a (possibly reused) session"""
         self.socket = socket
         self.addr = addr
         self.seq_num = 0
@@ -321,27 +706,66 @@ class ClientSession:
         self.rtp_stream = None
         self.rtp_socket = None
         self.client_rtp_port = None
+        self.rtp_dest = None  # (client host, client RTP port)
         self.server_rtp_port = None
         self.streaming_thread = None
+        self.cache_key = None  # FrameCache key of the video set up
+        self.cache_index = 0  # Next frame when streaming from FrameCache
+        self.rx = bytearray()  # Received RTSP bytes not yet parsed
+        self.prefetcher = None  # FramePrefetcher until the video is cached
     
     def cleanup(self):
         """Clean up session resources"""
         self.state = "INIT"
+        if self.prefetcher:
+            self.prefetcher.stop()
+            self.prefetcher = None
         if self.rtp_socket:
             self.rtp_socket.close()
         if self.video_stream:
             self.video_stream.close()
 
+class SessionPool:
+    """Thread-safe free list of ClientSession objects reused across connections"""
+    
+    def __init__(self, max_idle=64):
+        self.idle = collections.deque(maxlen=max_idle)
+        self.lock = threading.Lock()
+    
+    def acquire(self, socket, addr):
+        """Get a reset session for a new connection"""
+        with self.lock:
+            session = self.idle.pop() if self.idle else None
+        if session is None:
+            return ClientSession(socket, addr)
+        session.reset(socket, addr)
+        return session
+    
+    def release(self, session):
+        """Drop a finished session's references and keep it for reuse"""
+        # A stream thread still running would keep using the session
+        thread = session.streaming_thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=1.0)
+            if thread.is_alive():
+                return
+        
+        session.reset(None, None)
+        with self.lock:
+            self.idle.append(session)
+
 # Main server execution
 if __name__ == "__main__":
     import sys
     
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     port = int(sys.argv[1]) if len(sys.argv) > 1 else 8554
     
     server = RTSPServer(port)
     try:
         server.start()
     except KeyboardInterrupt:
-        print("\n🛑 Server interrupted by user")
+        logger.info("🛑 Server interrupted by user")
     finally:
         server.stop()
\ No newline at end of file